@@ -0,0 +1,239 @@
+# Command-line batch analysis of many Networks, for example one for each term
+# or department, writing one row of the data printed by printNetworkData
+# (see Network.getNetworkData) for each Network to a JSON Lines or CSV file.
+
+# Each input is a file name, a glob of file names (each file is one Network),
+# or name=file1,file2,... to analyze several files (for example, all the
+# files of a term) as one Network called name; globs can also be used in the
+# list of files. Networks are analyzed by a pool of worker processes, and each
+# row is written as soon as its Network is done, along with the seconds spent
+# on each stage. Running again with the same output file skips the inputs
+# that already have a row without an error, so a run that stopped part way
+# can be picked up where it left off. Inputs with the same links as one
+# already analyzed reuse its data instead of being analyzed again: inputs
+# whose files have the same bytes are found before any are loaded (see
+# loader.sourceHash), and the rest by the fingerprint of their links (see
+# fingerprint), which each worker checks against those of the other inputs
+# right after loading, before finding any of the data.
+
+# Example:
+#   python batchAnalysis.py "terms/*.csv" fall=f1.csv,f2.csv -o results.jsonl -w 8
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import time
+import traceback
+
+import loader
+from network import Network
+
+# columns of the output, in order
+FIELDS = ['input', 'files', 'fingerprint', 'duplicateOf', 'persons', 'groups', 'proportionPersons', 'proportionGroups',
+          'betweenness', 'wholeNetwork', 'componentPersons', 'componentGroups',
+          'meanCoEnrollments', 'meanUniqueCoEnrollments', 'uniqueEdges', 'density',
+          'clustering', 'charPathLength', 'diameter', 'reach1', 'reach2', 'reach3', 'reach4',
+          'loadSeconds', 'componentsSeconds', 'betweennessSeconds', 'coEnrollmentsSeconds',
+          'clusteringSeconds', 'pathsSeconds', 'totalSeconds', 'error']
+
+# the end of every row of each output format, so a row that was only partly
+# written can be found (a CSV field, such as the error, can hold '\n' but
+# not '\r\n', which the csv module ends its rows with)
+TERMINATORS = {'csv': b'\r\n', 'jsonl': b'\n'}
+
+# returns the jobs for the inputs as a list of [name, files], where name is
+# the file name for a single file
+def findJobs(inputs):
+    jobs = []
+    for text in inputs:
+        name, equals, files = text.partition('=')
+        if equals:
+            names = []
+            for pattern in files.split(','):
+                names.extend(_expand(pattern))
+            jobs.append([name, names])
+        else:
+            jobs.extend([[file, [file]] for file in _expand(text)])
+    return jobs
+
+def _expand(pattern):
+    found = sorted(glob.glob(pattern))
+    if len(found) == 0:
+        raise Exception("No files match " + pattern)
+    return found
+
+# returns the row of data for one job [name, files], with the error (and no
+# data) if the Network could not be analyzed
+# known (a dictionary, which may be shared between processes) maps the
+# fingerprints of jobs already analyzed, or being analyzed, to their names;
+# if the job's fingerprint is already in it, the row only has 'duplicateOf'
+# (the name of that job) and no data, otherwise the job is added to it
+def analyze(job, engine='projection', known=None):
+    name, files = job
+    row = {'input': name, 'files': ';'.join(files)}
+    start = time.perf_counter()
+    try:
+        network = Network(files, engine=engine)
+        timings = {'load': time.perf_counter() - start}
+        row['fingerprint'] = '%016x' % (network.getFingerprint())
+        if known is not None:
+            first = known.setdefault(row['fingerprint'], name)
+            if first != name:
+                row['duplicateOf'] = first
+                return row
+        row.update(network.getNetworkData(timings))
+        for stage, seconds in timings.items():
+            row[stage + 'Seconds'] = seconds
+    except Exception:
+        row['error'] = traceback.format_exc(limit=1).strip()
+    row['totalSeconds'] = time.perf_counter() - start
+    return row
+
+# returns the content hash (see loader.sourceHash) of the files of a job, or
+# None if they cannot be read
+def jobHash(job):
+    try:
+        return loader.sourceHash(job[1])
+    except Exception:
+        return None
+
+# returns the row for a job whose links are the same as those of the job of
+# row, reusing its data (without its timings)
+def duplicateRow(row, job):
+    copy = {field: value for field, value in row.items() if not field.endswith('Seconds')}
+    copy['input'] = job[0]
+    copy['files'] = ';'.join(job[1])
+    copy['duplicateOf'] = row['input']
+    return copy
+
+# returns a dictionary of input to row for the rows without an error in the
+# output file, only counting rows that parse and have every field of FIELDS
+# (a row cut off when a run stopped does not)
+def finishedRows(path, form):
+    finished = {}
+    if not os.path.exists(path):
+        return finished
+    with open(path, newline='') as file:
+        if form == 'csv':
+            rows = csv.DictReader(file)
+        else:
+            rows = (_parseLine(line) for line in file if line.strip())
+        for row in rows:
+            if row is None or not all(field in row and (form != 'csv' or row[field] is not None) for field in FIELDS):
+                continue
+            if not row.get('error'):
+                finished[row['input']] = row
+    return finished
+
+def _parseLine(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    return row if isinstance(row, dict) else None
+
+# cuts the output file back to the end of its last whole row, dropping a row
+# that was only partly written when a run stopped
+def dropPartialRow(path, form):
+    if not os.path.exists(path):
+        return
+    terminator = TERMINATORS[form]
+    with open(path, 'rb+') as file:
+        data = file.read()
+        last = data.rfind(terminator)
+        end = last + len(terminator) if last >= 0 else 0
+        if end < len(data):
+            file.truncate(end)
+
+# analyzes the jobs not already in the output file with a pool of worker
+# processes and appends their rows to it, returns the number of rows written
+# jobs with the same files (the same bytes) or links (the same fingerprint)
+# as a job analyzed in this run or in the output file are not analyzed
+# again, their rows reuse its data
+def runBatch(jobs, path, form='jsonl', workers=1, engine='projection'):
+    dropPartialRow(path, form)
+    finished = finishedRows(path, form)
+    jobs = [job for job in jobs if job[0] not in finished]
+
+    newFile = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as file:
+        writer = csv.DictWriter(file, FIELDS) if form == 'csv' else None
+        if writer is not None and newFile:
+            writer.writeheader()
+
+        # each row is written whole (with every field) and flushed
+        def write(row):
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                file.write(json.dumps({field: row.get(field) for field in FIELDS}) + '\n')
+            file.flush()
+
+        # rows of the jobs done (in this run or before) by name, and the
+        # jobs waiting for the row of the job with the same links
+        done = dict(finished)
+        waiting = {}
+
+        # writes the row of a job, and those of the jobs waiting for it
+        def record(row):
+            write(row)
+            done[row['input']] = row
+            for job in waiting.pop(row['input'], []):
+                record(duplicateRow(row, job))
+
+        # writes the row of a job with the same links as the job name, now
+        # or once that job is done
+        def finish(name, job):
+            if name in done:
+                record(duplicateRow(done[name], job))
+            else:
+                waiting.setdefault(name, []).append(job)
+
+        with multiprocessing.Manager() as manager, multiprocessing.Pool(max(1, min(workers, len(jobs)))) as pool:
+            known = manager.dict({row['fingerprint']: name for name, row in finished.items()
+                                  if row.get('fingerprint') and not row.get('duplicateOf')})
+
+            # the first job with each content hash is loaded, and the others
+            # wait for its row (jobs that cannot be read are loaded, to
+            # record their errors)
+            loaded = []
+            firsts = {}
+            for job, key in zip(jobs, pool.map(jobHash, jobs)):
+                if key is not None and key in firsts:
+                    finish(firsts[key], job)
+                else:
+                    loaded.append(job)
+                    if key is not None:
+                        firsts[key] = job[0]
+
+            run = pool.imap_unordered(_analyzeJob, [[job, engine, known] for job in loaded])
+            jobsByName = {job[0]: job for job in loaded}
+            for row in run:
+                if row.get('duplicateOf'):
+                    finish(row['duplicateOf'], jobsByName[row['input']])
+                else:
+                    record(row)
+    return len(jobs)
+
+def _analyzeJob(arguments):
+    return analyze(*arguments)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Analyze many person-to-group Networks.")
+    parser.add_argument('inputs', nargs='+', help="file, glob, or name=file1,file2,...")
+    parser.add_argument('-o', '--output', required=True, help="output file (.jsonl or .csv)")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], help="output format (default from the output file extension)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('-e', '--engine', choices=['projection', 'bipartite'], default='projection')
+    args = parser.parse_args(args)
+
+    form = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    jobs = findJobs(args.inputs)
+    count = runBatch(jobs, args.output, form, args.workers, args.engine)
+    print("Analyzed %d of %d Networks (%d already done)." % (count, len(jobs), len(jobs) - count))
+
+if __name__ == '__main__':
+    main()
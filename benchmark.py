@@ -0,0 +1,209 @@
+# Benchmarks of the Network methods on generated person-to-group data, to
+# see how they scale with the number of persons and to catch slowdowns.
+
+# The generator makes links like course enrollments: group sizes are heavy
+# tailed (a few very large groups and many small ones, with each group chosen
+# in proportion to a Pareto distributed popularity, where a smaller tail is
+# heavier), and each person has 1 + a Poisson number of enrollments. The same
+# seed always makes the same links.
+
+# Each method is timed on a Network with an empty cache (see
+# Network.invalidate), so it includes building the structures it needs; the
+# best of a few runs is kept, and the peak memory of one more run is found
+# with tracemalloc. Results are written as JSON, and can be compared with the
+# results of an earlier run (a baseline) to flag methods that got slower.
+
+# Networks up to the exact limit use the 'projection' engine and larger ones
+# the 'bipartite' engine (unless an engine is given), since the projection
+# engine builds the networkx person-to-person graph when the Network is made,
+# which does not fit in memory at 10^5 persons and more.
+
+# Every public getter is timed except: getPersons, getGroups, getFingerprint,
+# getCacheInfo and getLoadStats (they return values the Network already
+# holds); getPersonToGroupMatrix, getPersonToPerson and getBinPersonToPerson
+# (dense list of lists matrices, with memory in persons squared);
+# getBinPersonToPersonNetworkX and getPersonToGroupNetworkX (conversions to
+# networkx for drawing); getNetworkData (the sum of the getters it calls);
+# and getSmallWorld (a whole ensemble of randomized Networks, whose members
+# are timed by the getters they call).
+
+# Example:
+#   python benchmark.py --sizes 100 1000 10000 -o results.json --baseline baseline.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from network import Network
+
+# methods timed, as [name, function of a Network, exact], where exact marks
+# the methods whose time grows with persons * links, which are only run up to
+# a size limit
+METHODS = [
+    ['getLargestProportion', lambda network: network.getLargestProportion(), False],
+    ['largestComponentToNetwork', lambda network: network.largestComponentToNetwork(), False],
+    ['getMeanCoEnrollments', lambda network: network.getMeanCoEnrollments(), False],
+    ['getMeanUniqueCoEnrollments', lambda network: network.getMeanUniqueCoEnrollments(), False],
+    ['getUniqueEdges', lambda network: network.getUniqueEdges(), False],
+    ['getNetworkDensity', lambda network: network.getNetworkDensity(), False],
+    ['getAverageClusterCoeff', lambda network: network.getAverageClusterCoeff(), False],
+    ['getApproxCharPathLength', lambda network: network.getApproxCharPathLength(samples=50, seed=1), False],
+    ['getApproxNetworkDiameter', lambda network: network.getApproxNetworkDiameter(seed=1), False],
+    ['getApproxBetweennessCentrality', lambda network: network.getApproxBetweennessCentrality(samples=50, seed=1), False],
+    ['getCharPathLength', lambda network: network.getCharPathLength(), True],
+    ['getNetworkDiameter', lambda network: network.getNetworkDiameter(), True],
+    ['getBetweennessCentrality', lambda network: network.getBetweennessCentrality(), True],
+    ['getCoEnrollments', lambda network: network.getCoEnrollments(), False],
+    ['getUniqueCoEnrollments', lambda network: network.getUniqueCoEnrollments(), False],
+    ['getCoEnrollmentSummary', lambda network: network.getCoEnrollmentSummary(), False],
+    ['getClusterCoeffs', lambda network: network.getClusterCoeffs(), False],
+    ['getPersonToPersonEdges', lambda network: network.getPersonToPersonEdges(), False],
+    ['getApproxKStepReach', lambda network: network.getApproxKStepReach(4, True, samples=50, seed=1), False],
+    ['getApproxBetweennessCentralities', lambda network: network.getBetweennessCentralities(samples=50, seed=1), False],
+    ['getPersonReach', lambda network: network.getPersonReach(network.getPersons()[0], 2), False],
+    ['getPersonStats', lambda network: network.getPersonStats(network.getPersons()[0]), False],
+    ['getConnectingPath', lambda network: network.getConnectingPath(network.getPersons()[0], network.getPersons()[-1]), False],
+    ['getKStepReach', lambda network: network.getKStepReach(4, True), True],
+    ['getBoundedDiameter', lambda network: network.getBoundedDiameter(), True],
+    ['getBetweennessCentralities', lambda network: network.getBetweennessCentralities(), True],
+]
+
+# returns [persons, groups], the names of the person and group of each link,
+# for the given number of persons and groups (10 persons a group if groups is
+# None), with enrollments links a person on average
+# the same seed gives the same links
+def generateLinks(persons, groups=None, enrollments=4, tail=2.5, seed=0):
+    rng = np.random.default_rng(seed)
+    if groups is None:
+        groups = max(1, persons // 10)
+
+    counts = 1 + rng.poisson(max(enrollments - 1, 0), persons)
+    weights = 1 + rng.pareto(tail, groups)
+    rows = np.repeat(np.arange(persons), counts)
+    cols = rng.choice(groups, size=len(rows), p=weights / weights.sum())
+    return [['P%d' % (i) for i in rows.tolist()], ['G%d' % (g) for g in cols.tolist()]]
+
+# writes generated links (see generateLinks) to a file of person,group lines
+def writeLinks(path, persons, groups=None, enrollments=4, tail=2.5, seed=0):
+    names = generateLinks(persons, groups, enrollments, tail, seed)
+    with open(path, 'w') as file:
+        for person, group in zip(names[0], names[1]):
+            file.write(person + ',' + group + '\n')
+
+# returns [seconds, peakBytes] for function(): the best time of repeats runs
+# (before each of which reset() is called) and the peak memory allocated
+# during one more run
+def measure(function, reset, repeats=3):
+    best = float('inf')
+    for i in range(repeats):
+        reset()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    reset()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return [best, peak]
+
+# returns the list of results, each a dictionary with keywords 'size',
+# 'engine', 'method', 'seconds' and 'peakBytes' (or 'skipped'), for Networks
+# of each of the given numbers of persons; exact methods are skipped above
+# exactLimit persons, and report (if given) is called with each result as it
+# is found
+# engine is the Network engine, or None for 'projection' up to exactLimit
+# persons and 'bipartite' above it
+def runBenchmarks(sizes, repeats=3, exactLimit=10000, seed=0, methods=METHODS, report=None, engine=None):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            name = os.path.join(directory, 'links%d.csv' % (size))
+            writeLinks(name, size, seed=seed)
+            used = engine if engine is not None else ('projection' if size <= exactLimit else 'bipartite')
+
+            seconds, peak = measure(lambda: Network(name, engine=used), lambda: None, repeats)
+            results.append({'size': size, 'engine': used, 'method': 'Network', 'seconds': seconds, 'peakBytes': peak})
+            if report is not None:
+                report(results[-1])
+
+            network = Network(name, engine=used)
+            for method, function, exact in methods:
+                if exact and size > exactLimit:
+                    results.append({'size': size, 'engine': used, 'method': method, 'skipped': True})
+                else:
+                    seconds, peak = measure(lambda: function(network), network.invalidate, repeats)
+                    results.append({'size': size, 'engine': used, 'method': method, 'seconds': seconds, 'peakBytes': peak})
+                if report is not None:
+                    report(results[-1])
+    return results
+
+# returns the results that are slower than in the baseline (results of an
+# earlier run) with the same size, engine and method by more than tolerance
+# (a proportion), each as a dictionary with keywords 'size', 'method',
+# 'seconds', 'baseline' and 'ratio'; times under minSeconds in both are
+# ignored as noise
+def compareResults(results, baseline, tolerance=0.25, minSeconds=0.01):
+    key = lambda result: (result['size'], result.get('engine', 'projection'), result['method'])
+    earlier = {key(result): result for result in baseline if 'seconds' in result}
+    regressions = []
+    for result in results:
+        before = earlier.get(key(result))
+        if before is None or 'seconds' not in result:
+            continue
+        if max(result['seconds'], before['seconds']) < minSeconds:
+            continue
+        if result['seconds'] > before['seconds'] * (1 + tolerance):
+            regressions.append({'size': result['size'], 'method': result['method'], 'seconds': result['seconds'],
+                                'baseline': before['seconds'], 'ratio': result['seconds'] / before['seconds']})
+    return regressions
+
+def _printResult(result):
+    if 'seconds' in result:
+        print("%10d %-10s %-32s %10.4f s %12d bytes" % (result['size'], result['engine'], result['method'], result['seconds'], result['peakBytes']), flush=True)
+    else:
+        print("%10d %-10s %-32s    skipped" % (result['size'], result['engine'], result['method']), flush=True)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Network methods on generated data.")
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[100, 1000, 10000], help="numbers of persons")
+    parser.add_argument('-r', '--repeats', type=int, default=3)
+    parser.add_argument('--exact-limit', type=int, default=10000, help="most persons for the exact path metrics and betweenness")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-e', '--engine', choices=['projection', 'bipartite'],
+                        help="Network engine (default projection up to the exact limit, bipartite above it)")
+    parser.add_argument('-o', '--output', help="JSON file for the results")
+    parser.add_argument('-b', '--baseline', help="JSON results of an earlier run to compare with")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25, help="proportion slower than the baseline that is flagged")
+    args = parser.parse_args(args)
+
+    results = runBenchmarks(args.sizes, args.repeats, args.exact_limit, args.seed, report=_printResult, engine=args.engine)
+
+    if args.output is not None:
+        report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                  'results': results}
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compareResults(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Slower: %d %s %.4f s (baseline %.4f s, %.2fx)" % (regression['size'], regression['method'],
+                  regression['seconds'], regression['baseline'], regression['ratio']))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
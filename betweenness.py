@@ -0,0 +1,88 @@
+# Betweenness centrality of the person-to-group network with Brandes'
+# algorithm, used by Network in place of the networkx betweenness centrality.
+
+# The network is passed as the indptr and indices arrays of its CSR adjacency
+# (Network numbers the persons first, then the groups), as in paths. Each
+# search runs level by level over NumPy arrays: the shortest path counts of a
+# level are summed from the level before it, and the dependencies are summed
+# back from the last level to the first. Values are normalized the same way
+# as networkx (endpoints not counted).
+
+import numpy as np
+
+import paths
+
+# returns the dependencies of every node on the searches from the given
+# sources, summed (the betweenness before it is normalized)
+def dependencySums(arrays, sources):
+    indptr, indices = arrays
+    count = len(indptr) - 1
+    sums = np.zeros(count, dtype=float)
+    for source in sources:
+        sums += dependencies(indptr, indices, source)
+    return sums
+
+# returns the dependency of the source on every node: the sum over the
+# other nodes t of the fraction of shortest paths from the source to t that
+# go through the node
+def dependencies(indptr, indices, source):
+    count = len(indptr) - 1
+    dist = np.full(count, -1, dtype=np.int32)
+    dist[source] = 0
+    sigma = np.zeros(count, dtype=float)
+    sigma[source] = 1
+
+    # the links from each level to the next as [parents, children]
+    levels = []
+    frontier = np.array([source], dtype=indices.dtype)
+    level = 0
+    while len(frontier) > 0:
+        level = level + 1
+        children = paths.gatherNeighbors(indptr, indices, frontier)
+        parents = np.repeat(frontier, indptr[frontier + 1] - indptr[frontier])
+
+        found = np.unique(children[dist[children] < 0])
+        dist[found] = level
+        onPath = dist[children] == level
+        parents = parents[onPath]
+        children = children[onPath]
+
+        sigma += np.bincount(children, weights=sigma[parents], minlength=count)
+        levels.append([parents, children])
+        frontier = found
+
+    delta = np.zeros(count, dtype=float)
+    for parents, children in reversed(levels):
+        weights = sigma[parents] / sigma[children] * (1 + delta[children])
+        delta += np.bincount(parents, weights=weights, minlength=count)
+    delta[source] = 0
+    return delta
+
+# returns the betweenness centrality of every node, from searches from
+# every node (if samples is None) or from samples random pivot nodes, run by
+# a pool of workers if workers is more than 1
+# with pivots, the sums are scaled up to estimate the searches from every
+# node (as networkx does, with a pivot not counting its own search), which
+# needs at least 2 pivots
+def betweennessCentrality(arrays, workers=1, samples=None, seed=None):
+    if samples is not None and samples < 2:
+        raise Exception("Samples needs to be at least 2.")
+    count = len(arrays[0]) - 1
+    if samples is None or samples >= count:
+        sources = np.arange(count)
+    else:
+        sources = np.sort(np.random.default_rng(seed).permutation(count)[:samples])
+
+    if workers <= 1 or len(sources) < 2:
+        sums = dependencySums(arrays, sources)
+    else:
+        sums = np.sum(paths.mapChunks(dependencySums, arrays, sources, workers), axis=0)
+
+    if count <= 2:
+        return sums
+    if len(sources) == count:
+        return sums / ((count - 1) * (count - 2))
+
+    scale = np.full(count, 1 / (len(sources) * (count - 2)))
+    scale[sources] = 1 / ((len(sources) - 1) * (count - 2))
+    return sums * scale
@@ -0,0 +1,61 @@
+# Clustering coefficients of the binary person-to-person network, found by
+# counting triangles with sparse matrix products, used by Network in place of
+# the networkx clustering of the binary network.
+
+# The network is passed as the indptr and indices arrays of its (symmetric,
+# no self-loops) CSR adjacency, as in paths.
+
+import numpy as np
+from scipy import sparse
+
+# rows of the adjacency multiplied at a time are chosen so that a block holds
+# about this many two-step paths
+BLOCK_PATHS = 1 << 24
+
+# returns the number of triangles through every person, or through each of
+# the given rows (person IDs)
+# the triangles through person i are half the number of closed two-step paths
+# from i, the row sum of (A @ A) * A, found a block of rows at a time so the
+# two-step paths of only one block are held at once
+def triangleCounts(indptr, indices, blockPaths=BLOCK_PATHS, rows=None):
+    count = len(indptr) - 1
+    data = np.ones(len(indices), dtype=np.int64)
+    adjacency = sparse.csr_matrix((data, indices, indptr), shape=(count, count))
+    degrees = np.diff(indptr)
+    if rows is None:
+        rows = np.arange(count)
+
+    # two-step paths from each row, a block ends once it has enough of them
+    steps = np.zeros(len(rows) + 1, dtype=np.int64)
+    steps[1:] = np.cumsum(gatherDegrees(indptr, indices, degrees)[rows])
+
+    triangles = np.zeros(len(rows), dtype=np.int64)
+    start = 0
+    while start < len(rows):
+        end = int(np.searchsorted(steps, steps[start] + blockPaths, side='right')) - 1
+        end = min(max(end, start + 1), len(rows))
+        block = adjacency[rows[start:end]]
+        closed = (block @ adjacency).multiply(block)
+        triangles[start:end] = np.asarray(closed.sum(axis=1)).ravel() // 2
+        start = end
+    return triangles
+
+# returns the sum of the degrees of each row's neighbors (the number of
+# two-step paths from each row)
+def gatherDegrees(indptr, indices, degrees):
+    sums = np.zeros(len(indices) + 1, dtype=np.int64)
+    sums[1:] = np.cumsum(degrees[indices])
+    return sums[indptr[1:]] - sums[indptr[:-1]]
+
+# returns the clustering coefficient of every person (or of each of the
+# given rows), the triangles through the person over the pairs of its
+# neighbors (0 with fewer than 2 neighbors)
+def clusteringCoefficients(indptr, indices, rows=None):
+    degrees = np.diff(indptr).astype(np.int64)
+    if rows is not None:
+        degrees = degrees[rows]
+    triangles = triangleCounts(indptr, indices, rows=rows)
+    pairs = degrees * (degrees - 1) // 2
+    coefficients = np.zeros(len(degrees), dtype=float)
+    np.divide(triangles, pairs, out=coefficients, where=pairs > 0)
+    return coefficients
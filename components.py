@@ -0,0 +1,33 @@
+# Connected components of a network given as integer links, found with
+# union-find, used by Network for the largest component of the person-to-group
+# network.
+
+# Nodes are numbered 0, 1, ... count - 1 (Network numbers the persons first,
+# then the groups), and a link joins first[i] to second[i].
+
+import numpy as np
+
+# returns the component label of every node, labels are 0, 1, 2, ... in the
+# order of the first (lowest numbered) node of each component
+# union-find with path halving, where the root of each set is its lowest
+# numbered node, so it runs in near-linear time in the number of links
+def componentLabels(first, second, count):
+    parent = list(range(count))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        rootA = find(a)
+        rootB = find(b)
+        if rootA < rootB:
+            parent[rootB] = rootA
+        elif rootB < rootA:
+            parent[rootA] = rootB
+
+    roots = [find(node) for node in range(count)]
+    labels = np.unique(roots, return_inverse=True)[1]
+    return labels.astype(np.int32)
@@ -9,7 +9,11 @@
 # Example shows how naming the nodes in a particular way allows you to draw them
 # with different styles.
 
+# For large networks (thousands of persons or more), drawLargeNetwork uses the
+# grid-approximated layout and sampled edges of layout.py instead.
+
 from network import Network
+import layout
 import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
@@ -91,5 +95,22 @@ def drawPersonToPerson(files, seed=999999):
     
     
     
+def drawLargeNetwork(files, kind='personToPerson', seed=999999, previous=None):
+    net = Network(files, engine='bipartite')
+    
+    # groups are drawn in green, persons in the default blue
+    colors = {}
+    if kind == 'personToGroup':
+        colors = {group: green for group in net.getGroups()}
+    
+    # previous (an earlier layout) is only moved a little, for a network that
+    # changed slightly since
+    positions = layout.layoutNetwork(net, kind, seed=seed, previous=previous)
+    layout.drawNetwork(net, positions, kind, maxEdges=20000, seed=seed, colors=colors, edgeColor=lightG)
+    return positions
+    
+    
+    
 drawPersonToGroup(files)
-#drawPersonToPerson(files)
\ No newline at end of file
+#drawPersonToPerson(files)
+#drawLargeNetwork(files, 'personToGroup')
\ No newline at end of file
@@ -0,0 +1,48 @@
+# Order-independent content fingerprints of the links of a Network, so two
+# Networks can be compared (and duplicate inputs found) without comparing
+# their links.
+
+# Every person and group name is hashed (64 bits of BLAKE2b of its UTF-8
+# text, or of its repr if it is not a string), each link is hashed by mixing
+# the hashes of its person and group with the splitmix64 finalizer, and the
+# fingerprint is the sum of the link hashes modulo 2^64. A sum does not
+# depend on the order of the links, and can be kept up to date as links are
+# added (adding the link's hash) and removed (subtracting it). Equal link
+# sets always have equal fingerprints; different ones have equal
+# fingerprints only by a 1 in 2^64 chance.
+
+import hashlib
+
+import numpy as np
+
+MASK = (1 << 64) - 1
+
+# returns the 64-bit hashes of the names as an array
+def nameHashes(names):
+    hashes = np.empty(len(names), dtype=np.uint64)
+    for i, name in enumerate(names):
+        text = name if isinstance(name, str) else repr(name)
+        hashes[i] = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+    return hashes
+
+# returns the splitmix64 mix of every value of a uint64 array
+def mix(values):
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+# returns the hashes of links with the given person and group hashes
+def linkHashes(personHashes, groupHashes):
+    return mix(personHashes ^ mix(groupHashes))
+
+# returns the fingerprint (an int) of the links with the person and group
+# IDs rows and cols, where persons and groups are the lists of names
+def fingerprint(persons, groups, rows, cols):
+    hashes = linkHashes(nameHashes(persons)[rows], nameHashes(groups)[cols])
+    return int(hashes.sum(dtype=np.uint64))
+
+# returns the hash (an int) of the link between person and group, to add to
+# or subtract from a fingerprint (modulo 2^64)
+def linkHash(person, group):
+    return int(linkHashes(nameHashes([person]), nameHashes([group]))[0])
@@ -0,0 +1,196 @@
+# Force-directed layouts and drawings of large Networks, for when the
+# networkx spring layout and drawing (which compare every pair of nodes on
+# every iteration and draw every edge) are too slow.
+
+# The layout is Fruchterman-Reingold with the repulsion approximated on a
+# grid, all in NumPy. The grid cells are sized to hold similar numbers of
+# nodes. Nodes repel the other nodes in their own grid cell exactly, and the
+# nodes of every other cell as a single body at the cell's center of mass
+# (the idea of Barnes-Hut with one level of cells), while linked nodes
+# attract each other. Each iteration then takes time in about the number of
+# links plus nodes^(4/3), rather than nodes squared. A layout can be
+# warm-started from an earlier one (for example, after a few add/drop
+# changes), so only the new and moved nodes need to settle.
+
+# Drawings draw a random sample of at most maxEdges edges (the picture of a
+# dense network looks the same) as one line collection, and the nodes as
+# scatter plots. Matplotlib is only needed for drawing.
+
+import numpy as np
+from scipy import sparse
+
+# returns the positions (an array of [x, y] rows, in [0, 1] x [0, 1]) of
+# the nodes of the network with the CSR adjacency (indptr, indices) after
+# the given iterations
+# k is the ideal distance between nodes (1/sqrt(nodes) if None), initial is
+# an array of starting positions (random if None, with NaN rows for nodes
+# to be placed near their neighbors), and temperature is the largest first
+# step (a warm start should use a small one)
+def forceLayout(indptr, indices, iterations=50, k=None, seed=None, initial=None, temperature=0.1):
+    count = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    if count == 0:
+        return np.zeros((0, 2))
+    if k is None:
+        k = 1 / np.sqrt(count)
+    positions = _startPositions(indptr, indices, initial, rng)
+
+    # cells a side, so there are about count^(2/3) cells with count^(1/3)
+    # nodes each, which balances the cell to cell and node to node work
+    rows = np.repeat(np.arange(count), np.diff(indptr))
+    cells = max(1, int(round(count ** (1 / 3))))
+    for step in range(iterations):
+        force = _repulsion(positions, k, cells) + _attraction(positions, rows, indices, k)
+
+        # move each node along its force, by at most the temperature
+        length = np.sqrt((force ** 2).sum(axis=1))
+        limit = temperature * (1 - step / iterations)
+        scale = np.minimum(length, limit) / np.maximum(length, 1e-12)
+        positions = positions + force * scale[:, None]
+    return _rescaled(positions)
+
+def _startPositions(indptr, indices, initial, rng):
+    count = len(indptr) - 1
+    if initial is None:
+        return rng.random((count, 2))
+
+    # nodes without a position go to the middle of their placed neighbors,
+    # or anywhere if none of them are placed
+    positions = np.array(initial, dtype=float)
+    missing = np.isnan(positions).any(axis=1)
+    rows = np.repeat(np.arange(count), np.diff(indptr))
+    placed = ~missing[indices] & missing[rows]
+    sums = np.zeros((count, 2))
+    np.add.at(sums, rows[placed], positions[indices[placed]])
+    neighbors = np.bincount(rows[placed], minlength=count)
+    near = missing & (neighbors > 0)
+    positions[near] = sums[near] / neighbors[near, None]
+    far = missing & (neighbors == 0)
+    positions[far] = rng.random((int(far.sum()), 2))
+
+    # a little jitter so new nodes do not sit exactly on top of each other
+    positions[missing] += rng.normal(0, 0.01, (int(missing.sum()), 2))
+    return positions
+
+# repulsion k^2 / d from the nodes in the same cell (exactly) and from the
+# center of mass of every other cell (weighted by its nodes)
+def _repulsion(positions, k, cells):
+    # the cell edges are quantiles of each coordinate, so crowded parts of
+    # the layout get smaller cells
+    count = len(positions)
+    grid = np.zeros((count, 2), dtype=np.int64)
+    for axis in range(2):
+        edges = np.quantile(positions[:, axis], np.linspace(0, 1, cells + 1)[1:-1])
+        grid[:, axis] = np.searchsorted(edges, positions[:, axis], side='right')
+    cell = grid[:, 0] * cells + grid[:, 1]
+
+    # centers of mass of the cells
+    weights = np.bincount(cell, minlength=cells * cells).astype(float)
+    centers = np.zeros((cells * cells, 2))
+    for axis in range(2):
+        centers[:, axis] = np.bincount(cell, weights=positions[:, axis], minlength=cells * cells)
+    used = np.flatnonzero(weights)
+    centers = centers[used] / weights[used, None]
+    weights = weights[used]
+
+    # cell to cell, a block of cells at a time, leaving out a cell itself
+    cellForce = np.zeros((len(used), 2))
+    block = max(1, (1 << 22) // len(used))
+    for start in range(0, len(used), block):
+        delta = centers[start:start + block, None, :] - centers[None, :, :]
+        distance2 = np.maximum((delta ** 2).sum(axis=2), 1e-12)
+        strength = k * k * weights[None, :] / distance2
+        own = np.arange(len(strength))
+        strength[own, start + own] = 0
+        cellForce[start:start + block] = (delta * strength[:, :, None]).sum(axis=1)
+    force = cellForce[np.searchsorted(used, cell)]
+
+    # node to node within each cell: with the nodes sorted by cell, node
+    # order[j] is paired with each node from the start to the end of its cell
+    order = np.argsort(cell, kind='stable')
+    sortedCell = cell[order]
+    sizes = np.bincount(cell, minlength=cells * cells)
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    pairs = sizes[sortedCell]
+    first = np.repeat(order, pairs)
+    offsets = np.arange(len(first)) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+    second = order[np.repeat(starts[sortedCell], pairs) + offsets]
+    delta = positions[first] - positions[second]
+    distance2 = np.maximum((delta ** 2).sum(axis=1), 1e-12)
+    strength = np.where(first != second, k * k / distance2, 0)
+    for axis in range(2):
+        force[:, axis] += np.bincount(first, weights=delta[:, axis] * strength, minlength=count)
+    return force
+
+# attraction d^2 / k between linked nodes, pulling each node toward each
+# of its neighbors
+def _attraction(positions, rows, indices, k):
+    delta = positions[indices] - positions[rows]
+    distance = np.sqrt((delta ** 2).sum(axis=1))
+    force = np.zeros_like(positions)
+    for axis in range(2):
+        force[:, axis] = np.bincount(rows, weights=delta[:, axis] * distance / k, minlength=len(positions))
+    return force
+
+def _rescaled(positions):
+    low = positions.min(axis=0)
+    size = np.maximum(positions.max(axis=0) - low, 1e-12)
+    return (positions - low) / size
+
+# returns [names, adjacency] of the binary person-to-person network
+# ('personToPerson') or the person-to-group network ('personToGroup',
+# persons first, then groups) of a Network
+def networkAdjacency(network, kind='personToPerson'):
+    if kind == 'personToPerson':
+        adjacency = network._getProjection()
+        return [network.getPersons(), adjacency]
+    if kind == 'personToGroup':
+        incidence = network._getIncidence()
+        adjacency = sparse.bmat([[None, incidence], [incidence.T, None]], format='csr')
+        return [network.getPersons() + network.getGroups(), adjacency]
+    raise Exception("Kind needs to be 'personToPerson' or 'personToGroup'.")
+
+# returns the layout of a Network as a dictionary of name to [x, y], in the
+# format of the networkx layouts, for the kind of network (see
+# networkAdjacency)
+# previous is a layout from before the Network changed; the names in it
+# start where they were and the rest are placed near their neighbors, and
+# the layout is only settled with small steps
+def layoutNetwork(network, kind='personToPerson', iterations=50, seed=None, previous=None):
+    names, adjacency = networkAdjacency(network, kind)
+    temperature = 0.1
+    initial = None
+    if previous is not None:
+        initial = np.array([previous.get(name, [np.nan, np.nan]) for name in names], dtype=float).reshape(len(names), 2)
+        temperature = 0.01
+    positions = forceLayout(adjacency.indptr, adjacency.indices, iterations, seed=seed, initial=initial, temperature=temperature)
+    return dict(zip(names, positions.tolist()))
+
+# draws a Network with a layout from layoutNetwork on the Matplotlib axes
+# (the current axes if None), with a random sample of at most maxEdges
+# edges; colors is a dictionary of name to color (nodes not in it are
+# drawn in nodeColor)
+def drawNetwork(network, positions, kind='personToPerson', ax=None, maxEdges=20000, seed=None,
+                colors=None, nodeColor='#2471A3', edgeColor='#ABB2B9', nodeSize=5, edgeWidth=0.3):
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    if ax is None:
+        ax = plt.gca()
+    names, adjacency = networkAdjacency(network, kind)
+    upper = sparse.triu(adjacency, k=1, format='coo')
+    first, second = upper.row, upper.col
+    if len(first) > maxEdges:
+        picked = np.random.default_rng(seed).choice(len(first), size=maxEdges, replace=False)
+        first, second = first[picked], second[picked]
+
+    points = np.array([positions[name] for name in names], dtype=float).reshape(len(names), 2)
+    lines = np.stack((points[first], points[second]), axis=1)
+    ax.add_collection(LineCollection(lines, colors=edgeColor, linewidths=edgeWidth, zorder=1))
+
+    if colors is None:
+        colors = {}
+    ax.scatter(points[:, 0], points[:, 1], s=nodeSize, c=[colors.get(name, nodeColor) for name in names], zorder=2)
+    ax.set_axis_off()
+    ax.autoscale()
+    return ax
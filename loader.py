@@ -0,0 +1,312 @@
+# Bulk loading of person-to-group links for Network, from files with a
+# person,group edge on each line or from a list of [person, group] lists.
+
+# Files are read in large chunks (optionally through a memory map), each chunk
+# is split into persons and groups with NumPy string operations, and the names
+# are interned to integer IDs as they are read, so the names of the links are
+# never all held as Python strings at once. Several files can be read at the
+# same time. Repeated links are dropped, keeping the first of each.
+
+# The links of a sequence of terms can be loaded together (loadTerms), with
+# the names of every term interned to one shared set of IDs and each term's
+# links kept as a slice of the same arrays.
+
+# Links that do not fit in memory can be read a chunk at a time (LinkStream),
+# holding only the names and the links of one chunk.
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import mmap
+import time
+
+import numpy as np
+
+# bytes read from a file at a time
+CHUNK_SIZE = 1 << 24
+
+# returns [persons, groups, rows, cols, stats] for the links in edges (a file
+# name, a list of file names, or a list of [person, group] lists): the sorted
+# lists of person and group names, the IDs (positions in those lists) of each
+# link's person and group as int32 arrays, and a dictionary of load
+# statistics with keywords 'files', 'rows' (links read), 'links' (links kept),
+# 'seconds', 'rowsPerSec' and 'hash' (see sourceHash)
+# workers is the number of files read at the same time, and memoryMap reads
+# the files through a memory map instead of file reads
+def loadLinks(edges, workers=1, memoryMap=False, chunkSize=CHUNK_SIZE):
+    start = time.perf_counter()
+    files = _sourceFiles(edges)
+
+    # each part is [persons, groups, rows, cols, digest] with IDs local to
+    # the part, and the digest of the file it was read from
+    if len(files) == 0:
+        parts = [_edgesPart(edges)]
+    else:
+        parts = _readFiles(files, workers, memoryMap, chunkSize)
+
+    persons, groups, rows, cols = _mergeParts([part[:4] for part in parts])
+    numRows = len(rows)
+    rows, cols = _dropRepeats(rows, cols, len(groups))
+
+    seconds = time.perf_counter() - start
+    stats = {'files': len(files), 'rows': numRows, 'links': len(rows), 'seconds': seconds,
+             'rowsPerSec': numRows / seconds if seconds > 0 else float('inf'),
+             'hash': _combineDigests([part[4] for part in parts]) if len(files) > 0 else None}
+    return [persons, groups, rows, cols, stats]
+
+# returns [persons, groups, rows, cols, offsets, stats] for a sequence of
+# terms, each one edges as for loadLinks: the links of all the terms with
+# IDs in one shared (sorted) list of persons and of groups, where the links
+# of term t are rows[offsets[t]:offsets[t+1]] and cols[offsets[t]:offsets[t+1]]
+# repeated links are dropped within a term (but not between terms), and the
+# files of all the terms are read workers at a time
+def loadTerms(terms, workers=1, memoryMap=False, chunkSize=CHUNK_SIZE):
+    start = time.perf_counter()
+    sources = [_sourceFiles(term) for term in terms]
+    read = _readFiles([name for files in sources for name in files], workers, memoryMap, chunkSize)
+
+    # parts in term order, and the term of each
+    parts = []
+    termOf = []
+    for t, (term, files) in enumerate(zip(terms, sources)):
+        if len(files) == 0:
+            parts.append(_edgesPart(term))
+            termOf.append(t)
+        else:
+            parts.extend(read[:len(files)])
+            termOf.extend([t] * len(files))
+            read = read[len(files):]
+
+    persons, groups, rows, cols = _mergeParts([part[:4] for part in parts])
+    numRows = len(rows)
+    linkTerms = np.repeat(np.array(termOf, dtype=np.int64), [len(part[2]) for part in parts])
+
+    # drop the repeats of each term, keeping the links in term order
+    keptRows = []
+    keptCols = []
+    offsets = [0]
+    for t in range(len(terms)):
+        inTerm = linkTerms == t
+        termRows, termCols = _dropRepeats(rows[inTerm], cols[inTerm], len(groups))
+        keptRows.append(termRows)
+        keptCols.append(termCols)
+        offsets.append(offsets[-1] + len(termRows))
+    rows = _concatenate(keptRows)
+    cols = _concatenate(keptCols)
+
+    seconds = time.perf_counter() - start
+    stats = {'files': sum(len(files) for files in sources), 'terms': len(terms), 'rows': numRows, 'links': len(rows),
+             'seconds': seconds, 'rowsPerSec': numRows / seconds if seconds > 0 else float('inf')}
+    return [persons, groups, rows, cols, np.array(offsets, dtype=np.int64), stats]
+
+# reads the links in edges (as for loadLinks) a chunk at a time: iterating
+# gives [rows, cols] for each chunk, with IDs numbered in the order the names
+# are first seen (repeated links are not dropped), and once every chunk is
+# read getNames and getStats give the names and statistics
+class LinkStream:
+    def __init__(self, edges, memoryMap=False, chunkSize=CHUNK_SIZE):
+        self._edges = edges
+        self._files = _sourceFiles(edges)
+        self._memoryMap = memoryMap
+        self._chunkSize = chunkSize
+        self._table = _Interned()
+        self._digests = []
+        self._rows = 0
+        self._seconds = 0
+
+    def __iter__(self):
+        start = time.perf_counter()
+        if len(self._files) == 0:
+            yield self._add([edge[0] for edge in self._edges], [edge[1] for edge in self._edges])
+        for name in self._files:
+            digest = hashlib.sha256()
+            line = 1
+            for text in readChunks(name, self._memoryMap, self._chunkSize, digest):
+                yield self._add(*parseChunk(text, name, line))
+                line = line + text.count('\n')
+            self._digests.append(digest.digest())
+        self._seconds = time.perf_counter() - start
+
+    def _add(self, persons, groups):
+        self._rows = self._rows + len(persons)
+        return [_intern(persons, self._table.personIds), _intern(groups, self._table.groupIds)]
+
+    # returns [persons, groups, personMap, groupMap]: the sorted lists of
+    # person and group names, and the map from the IDs of the chunks to the
+    # positions in them
+    def getNames(self):
+        persons, personMap = _sortNames(list(self._table.personIds))
+        groups, groupMap = _sortNames(list(self._table.groupIds))
+        return [persons, groups, personMap, groupMap]
+
+    # returns the statistics of the links read, as for loadLinks but without
+    # 'links' (the links kept, which are only known once repeats are dropped)
+    def getStats(self):
+        return {'files': len(self._files), 'rows': self._rows, 'seconds': self._seconds,
+                'rowsPerSec': self._rows / self._seconds if self._seconds > 0 else float('inf'),
+                'hash': _combineDigests(self._digests) if len(self._files) > 0 else None}
+
+# returns the files named by edges (a file name, a list of file names, or a
+# list of [person, group] lists), an empty list for a list of edges
+def _sourceFiles(edges):
+    if isinstance(edges, str):
+        return [edges]
+    elif isinstance(edges, list) and len(edges) != 0 and isinstance(edges[0], (list, tuple)):
+        return []
+    elif isinstance(edges, list) and len(edges) != 0 and isinstance(edges[0], str):
+        return edges
+    raise Exception("Constructor needs a file name, a list of file names, or list of edges.")
+
+# interns a list of [person, group] lists as a part (see loadLinks)
+def _edgesPart(edges):
+    table = _Interned()
+    return table.add([edge[0] for edge in edges], [edge[1] for edge in edges]) + [None]
+
+# reads the files as parts (see loadLinks), workers files at a time
+def _readFiles(files, workers, memoryMap, chunkSize):
+    read = lambda name: _readFile(name, memoryMap, chunkSize)
+    if workers is not None and workers <= 1:
+        return [read(name) for name in files]
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(read, files))
+
+# returns the content hash (a hex string) of a file name or a list of file
+# names, the same as the 'hash' of loadLinks for those files, or None for a
+# list of edges
+def sourceHash(edges):
+    if isinstance(edges, str):
+        edges = [edges]
+    if len(edges) == 0 or not isinstance(edges[0], str):
+        return None
+
+    digests = []
+    for name in edges:
+        digest = hashlib.sha256()
+        for block in readChunks(name, digest=digest):
+            pass
+        digests.append(digest.digest())
+    return _combineDigests(digests)
+
+def _combineDigests(digests):
+    return hashlib.sha256(b''.join(digests)).hexdigest()
+
+# returns the chunks of text in a file, each ending at the end of a line
+# if digest (a hashlib object) is given, it is updated with every byte read
+def readChunks(name, memoryMap=False, chunkSize=CHUNK_SIZE, digest=None):
+    with open(name, 'rb') as file:
+        # ignore errant BOM characters
+        start = 3 if file.read(3) == b'\xef\xbb\xbf' else 0
+        file.seek(start)
+
+        if memoryMap:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                return
+            blocks = (data[i:i + chunkSize] for i in range(start, len(data), chunkSize))
+        else:
+            blocks = iter(lambda: file.read(chunkSize), b'')
+
+        rest = b''
+        for block in blocks:
+            if digest is not None:
+                digest.update(block)
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            if end > 0:
+                yield block[:end].decode('utf-8')
+        if len(rest) > 0:
+            yield rest.decode('utf-8')
+
+# returns [persons, groups] as arrays of names for the lines of text of the
+# form person,group (any more fields are ignored, blank lines are skipped)
+# a line without a comma raises an Exception naming the file name and the
+# line's number, counting from first (the number of the first line of text)
+def parseChunk(text, name='', first=1):
+    lines = np.array(text.split('\n'), dtype=str)
+    lines = np.char.strip(lines)
+    numbers = np.flatnonzero(np.char.str_len(lines) > 0)
+    lines = lines[numbers]
+    if len(lines) == 0:
+        return [lines, lines]
+
+    fields = np.char.partition(lines, ',')
+    missing = np.flatnonzero(fields[:, 1] == '')
+    if len(missing) > 0:
+        raise Exception("Line %d of %s has no comma." % (first + numbers[missing[0]], name))
+    persons = fields[:, 0]
+    groups = np.char.partition(fields[:, 2], ',')[:, 0]
+    return [persons, groups]
+
+# reads and interns the links in one file, with IDs local to the file
+def _readFile(name, memoryMap, chunkSize):
+    table = _Interned()
+    digest = hashlib.sha256()
+    rows = []
+    cols = []
+    line = 1
+    for text in readChunks(name, memoryMap, chunkSize, digest):
+        persons, groups = parseChunk(text, name, line)
+        line = line + text.count('\n')
+        rows.append(_intern(persons, table.personIds))
+        cols.append(_intern(groups, table.groupIds))
+    return [list(table.personIds), list(table.groupIds), _concatenate(rows), _concatenate(cols), digest.digest()]
+
+# name to ID tables that grow as names are added, the IDs are only local
+# (they are renumbered in sorted order once everything is read)
+class _Interned:
+    def __init__(self):
+        self.personIds = {}
+        self.groupIds = {}
+
+    # interns the names of some links, returns [persons, groups, rows, cols]
+    def add(self, persons, groups):
+        rows = _intern(persons, self.personIds)
+        cols = _intern(groups, self.groupIds)
+        return [list(self.personIds), list(self.groupIds), rows, cols]
+
+# returns the IDs of the names, adding new names to ids
+def _intern(values, ids):
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    for name in set(values).difference(ids):
+        ids[name] = len(ids)
+    return np.fromiter(map(ids.__getitem__, values), dtype=np.int32, count=len(values))
+
+# merges parts with local IDs into sorted lists of persons and groups and
+# the IDs of every link in them
+def _mergeParts(parts):
+    table = _Interned()
+    rows = []
+    cols = []
+    for persons, groups, partRows, partCols in parts:
+        # local ID to ID in the merged table
+        personMap = _intern(persons, table.personIds)
+        groupMap = _intern(groups, table.groupIds)
+        rows.append(personMap[partRows])
+        cols.append(groupMap[partCols])
+    rows = _concatenate(rows)
+    cols = _concatenate(cols)
+
+    # number the persons and groups in sorted order
+    persons, personMap = _sortNames(list(table.personIds))
+    groups, groupMap = _sortNames(list(table.groupIds))
+    return [persons, groups, personMap[rows], groupMap[cols]]
+
+# returns [sorted names, map from old ID to sorted ID]
+def _sortNames(names):
+    order = sorted(range(len(names)), key=names.__getitem__)
+    newIds = np.empty(len(names), dtype=np.int32)
+    newIds[order] = np.arange(len(names), dtype=np.int32)
+    return [[names[i] for i in order], newIds]
+
+# drops repeated links, keeping the first of each in order
+def _dropRepeats(rows, cols, numGroups):
+    keys = rows.astype(np.int64) * max(numGroups, 1) + cols
+    first = np.sort(np.unique(keys, return_index=True)[1])
+    return [rows[first], cols[first]]
+
+def _concatenate(arrays):
+    if len(arrays) == 0:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(arrays).astype(np.int32)
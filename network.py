@@ -3,7 +3,8 @@
 
 # Network class for a 2-mode (person-to-group) network that provides methods 
 # for getting the list of persons; the list of groups; 
-# the person-to-group network as a matrix (list of lists);
+# the person-to-group network as a matrix (list of lists), which is held
+# internally as a sparse (CSR) incidence matrix;
 # the person-to-person network as a matrix (list of lists);
 # the binary person-to-person network as a matrix (list of lists);
 # the largest component as a Network;
@@ -18,110 +19,289 @@
 # described above and methods to get the person-to-group and person-to-person
 # networks as NetworkX objects for ease of drawing.
 
+# Everything derived from the links (the incidence and person-to-person
+# matrices, the binary network, components, distance histogram, clustering and
+# betweenness) is built on first use and cached, so the methods that need the
+# same structure share it.
+
+# Links can be added and removed in place (for example, for add/drop events).
+# The binary network, unique edges, density, mean (unique) co-enrollments and
+# components (for added links) are kept up to date with each change; the
+# incidence and person-to-person matrices, components and clustering are
+# carried over to the changed links when next needed (clustering is found
+# again only for the persons whose neighbors changed), and everything else
+# is rebuilt.
+
+# A Profiler (see profiler) can be given to a Network to record the time,
+# memory and counts of each stage it runs, such as reading the links or
+# building one of the structures above.
+
+# The path metrics (characteristic path length, diameter, k-step reach) can be
+# computed by one of two engines, chosen when the Network is created:
+# 'projection' searches the binary person-to-person network, and 'bipartite'
+# searches the person-to-group links directly (person -> groups -> persons)
+# so the person-to-person network is only built if another method needs it.
+# For networks whose person-to-person network does not fit in memory, see
+# outOfCore.
+
+# Questions about one person (who they can reach in k steps and through which
+# groups, their co-enrollments and clustering, and how they are linked to
+# another person) are answered by searching the person-to-group links from
+# that person, only as far as needed. The searches of the most recently asked
+# about persons are kept (least recently used are dropped first), so asking
+# again, or for more steps, carries on from where the last search stopped.
+
+from collections import OrderedDict
+from contextlib import nullcontext
+import os
+import sys
+import time
+
 import networkx as nx
 import numpy as np
+from scipy import sparse
+
+import betweenness
+import clustering
+import components
+import fingerprint
+import loader
+import nullModel
+import paths
+import snapshot
+
+# most searches kept for the person queries (getPersonReach, getPersonStats
+# and getConnectingPath), and most person IDs held by them altogether
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_IDS = 1 << 24
 
 class Network:
     # creates a 2-mode network from a file containing edges of the form
     # person,group on each line, a list of files each of the form described
     # previously, or from a list of lists of the form [person,group]
-    def __init__(self, edges):
-        # get the edges/links
-        self._links = []
-        
-        # single file
-        if isinstance(edges, str):
-            # use UTF-8-sig to ignore errant BOM characters
-            file = open(edges, 'r', encoding = 'utf-8-sig')
-            for line in file:
-                result = line.strip().split(',')
-                self._links.append(result)
-            file.close()
-        elif isinstance(edges, list):
-            # lists of edges
-            if (len(edges) != 0 and isinstance(edges[0], list)):
-                for edge in edges:
-                    self._links.append(list(edge))
-                    
-            # list of files
-            elif (len(edges) != 0 and isinstance(edges[0], str)):
-                for item in edges:
-                    # use UTF-8-sig to ignore errant BOM characters
-                    file = open(item, 'r', encoding = 'utf-8-sig')
-                    for line in file:
-                        result = line.strip().split(',')
-                        self._links.append(result)
-                    file.close()
-            else:
-                raise Exception("Constructor needs a file name, a list of file names, or list of edges.")            
-        else:
-            raise Exception("Constructor needs a file name, a list of file names, or list of edges.")
-        
-        # list of persons, list of groups
-        persons = set()
-        groups = set()
-        for link in self._links:
-            persons.add(link[0])
-            groups.add(link[1])
-        self._persons = list(persons)
-        self._groups = list(groups)
-        self._persons.sort()
-        self._groups.sort()
-                
-        # binary person to person network as a networkx graph
-        network = self.getBinPersonToPerson()
-        self._network = nx.Graph()
+    # engine is 'projection' or 'bipartite' (see above), and workers is the
+    # number of processes used for the path metrics (None for all cores) and
+    # of files read at the same time; memoryMap reads files through a memory
+    # map (see loader); profiler is a Profiler that records the stages run
+    def __init__(self, edges, engine='projection', workers=1, memoryMap=False, profiler=None):
+        if engine not in ('projection', 'bipartite'):
+            raise Exception("Engine needs to be 'projection' or 'bipartite'.")
+        self._engine = engine
+        self._workers = workers if workers is not None else os.cpu_count()
+        self._profiler = profiler
+        
+        # get the edges/links, interned: list of persons, list of groups
+        # (both sorted), and the ID (position in those lists) of each link's
+        # person and group, repeated links are dropped
+        with self._stage('load') as record:
+            persons, groups, rows, cols, stats = loader.loadLinks(edges, self._workers, memoryMap)
+            record['counts'].update(files=stats['files'], rows=stats['rows'], links=stats['links'])
+        self._loadStats = stats
+        self._sourceHash = stats['hash']
+        self._build(persons, groups, rows, cols)
+        
+        # the projection engine builds the binary person to person network
+        # now, the bipartite engine only on first use
+        if self._engine == 'projection':
+            self._getNetwork()
+    
+    # creates a Network from sorted lists of persons and groups and the
+    # ID (position in those lists) of each link's person and group, without
+    # going back to the names of the links
+    @classmethod
+    def _fromArrays(cls, persons, groups, rows, cols, engine='projection', workers=1, profiler=None):
+        network = cls.__new__(cls)
+        network._engine = engine
+        network._workers = workers
+        network._profiler = profiler
+        network._loadStats = None
+        network._sourceHash = None
+        network._build(persons, groups, rows, cols)
+        return network
+    
+    # opens a Network saved with save, memory-mapping its arrays unless 
+    # memoryMap is false
+    # if sources (a file name or list of file names) is given, raises an
+    # exception if the snapshot was not made from those files as they are now
+    @classmethod
+    def load(cls, path, sources=None, workers=1, memoryMap=True, profiler=None):
+        header, arrays = snapshot.readSnapshot(path, memoryMap)
+        if sources is not None and header['sourceHash'] != loader.sourceHash(sources):
+            raise Exception("Snapshot is out of date with its source files: " + path)
+        
+        network = cls.__new__(cls)
+        network._engine = header['engine']
+        network._workers = workers if workers is not None else os.cpu_count()
+        network._profiler = profiler
+        network._loadStats = None
+        network._sourceHash = header['sourceHash']
+        
+        persons = snapshot.decodeNames(arrays['personNames'], arrays['personOffsets'])
+        groups = snapshot.decodeNames(arrays['groupNames'], arrays['groupOffsets'])
+        known = int(header['fingerprint'], 16) if 'fingerprint' in header else None
+        network._build(persons, groups, arrays['linkPersons'], arrays['linkGroups'], known)
         
-        for i in range(len(network)):
-            for k in range(len(network)):
-                if i!=k and network[i][k] == 1:
-                    self._network.add_edge(self._persons[i], self._persons[k])        
+        # structures that had been found before the Network was saved
+        shape = (len(persons), len(groups))
+        network._cache['incidence'] = sparse.csr_matrix((np.ones(len(arrays['incidenceIdx']), dtype=np.int32), arrays['incidenceIdx'], arrays['incidencePtr']), shape=shape, copy=False)
+        if 'projectionPtr' in arrays:
+            shape = (len(persons), len(persons))
+            network._cache['projection'] = sparse.csr_matrix((arrays['projectionData'], arrays['projectionIdx'], arrays['projectionPtr']), shape=shape, copy=False)
+        if 'components' in arrays:
+            network._cache['components'] = arrays['components']
+        if 'histogram' in arrays:
+            network._cache['histogram'] = [arrays['histogram'], header['unreachable']]
+        return network
+    
+    # saves the Network to a binary snapshot file (see snapshot) that can be 
+    # opened with Network.load, along with the person-to-person counts,
+    # components and distance histogram if they have been found
+    def save(self, path):
+        self._sync()
+        arrays = {}
+        arrays['personNames'], arrays['personOffsets'] = snapshot.encodeNames(self._persons)
+        arrays['groupNames'], arrays['groupOffsets'] = snapshot.encodeNames(self._groups)
+        arrays['linkPersons'] = self._linkPersons
+        arrays['linkGroups'] = self._linkGroups
+        arrays['incidencePtr'] = self._getIncidence().indptr
+        arrays['incidenceIdx'] = self._getIncidence().indices
+        
+        header = {'engine': self._engine, 'sourceHash': self._sourceHash, 'unreachable': None,
+                  'fingerprint': '%016x' % (self._fingerprint)}
+        if 'projection' in self._cache:
+            arrays['projectionPtr'] = self._cache['projection'].indptr
+            arrays['projectionIdx'] = self._cache['projection'].indices
+            arrays['projectionData'] = self._cache['projection'].data
+        if 'components' in self._cache:
+            arrays['components'] = self._cache['components']
+        if 'histogram' in self._cache:
+            arrays['histogram'] = self._cache['histogram'][0]
+            header['unreachable'] = int(self._cache['histogram'][1])
+        snapshot.writeSnapshot(path, header, arrays)
+    
+    # sets up the persons, groups and links, and clears the structures 
+    # derived from them
+    # everything inside the Network works on person and group IDs, names are
+    # only used by the methods that return them
+    # known is the fingerprint of the links, if it is already known
+    def _build(self, persons, groups, rows, cols, known=None):
+        # ID to name, and name to ID
+        self._persons = persons
+        self._groups = groups
+        self._personIds = {name: i for i, name in enumerate(persons)}
+        self._groupIds = {name: i for i, name in enumerate(groups)}
+        
+        # links as person and group IDs (8 bytes a link)
+        self._linkPersons = np.asarray(rows, dtype=np.int32)
+        self._linkGroups = np.asarray(cols, dtype=np.int32)
         
+        # content fingerprint of the links (see fingerprint)
+        if known is None:
+            known = fingerprint.fingerprint(persons, groups, self._linkPersons, self._linkGroups)
+        self._fingerprint = known
+        
+        self._cache = {}
+        self._updates = None
+    
+    # returns the content fingerprint of the links (an int), the same for 
+    # Networks with the same links, whatever their order
+    def getFingerprint(self):
+        return self._fingerprint
+    
+    # gets the structure cached under name, building it with build() on
+    # first use (a profiler stage of the same name, with the given counts)
+    def _cached(self, name, build, **counts):
+        self._sync()
+        if name not in self._cache:
+            with self._stage(name, **counts) as record:
+                self._cache[name] = build()
+                record['counts'].update(_countsOf(self._cache[name]))
+        return self._cache[name]
+    
+    # returns the profiler stage (see profiler.Profiler.stage), or a stand-in
+    # if there is no profiler
+    def _stage(self, name, **counts):
+        if self._profiler is None:
+            return nullcontext({'counts': {}})
+        return self._profiler.stage(name, **counts)
+    
+    # clears every cached structure, so they are built again from the links
+    # when next needed
+    def invalidate(self):
+        self._cache = {}
+    
+    # returns a dictionary of the names of the cached structures and the
+    # (approximate) number of bytes each one holds
+    def getCacheInfo(self):
+        return {name: _memoryOf(value) for name, value in self._cache.items()}
+    
+    # return the statistics of reading the links (see loader.loadLinks) as a
+    # dictionary, including the rows read per second, or None for a Network
+    # made from another Network
+    def getLoadStats(self):
+        return dict(self._loadStats) if self._loadStats is not None else None
     
     # return the list of persons
     def getPersons(self):
+        self._sync()
         return list(self._persons)
     
     # return the list of groups
     def getGroups(self):
+        self._sync()
         return list(self._groups)
     
     # return the binary person to person as a networkx
     # useful for drawing the network and analysis in other methods
     def getBinPersonToPersonNetworkX(self):
-        return nx.Graph(self._network)
+        return nx.Graph(self._getNetwork())
+    
+    # get the binary person to person network as a networkx graph, built in
+    # bulk from the pairs above the diagonal of the projection
+    def _getNetwork(self):
+        return self._cached('graph', self._buildNetwork)
+    
+    def _buildNetwork(self):
+        upper = sparse.triu(self._getProjection(), k=1, format='coo')
+        network = nx.Graph()
+        network.add_edges_from((self._persons[i], self._persons[k]) for i, k in zip(upper.row.tolist(), upper.col.tolist()))
+        return network
+    
+    # get the person-to-group incidence as a sparse matrix
+    def _getIncidence(self):
+        return self._cached('incidence', lambda: self._getBipartiteGraph(self._linkPersons, self._linkGroups))
 
-    # create the bipartite 2-mode graph from persons and groups
-    # as a matrix (list of lists)
-    def _getBipartiteGraph(self):
-        persons = list(self.getPersons())
-        groups = list(self.getGroups())
-        persons.sort()
-        groups.sort()
-        
-        matrix = []
-        for i in range(len(persons)):
-            matrix.append([0]*len(groups))
-        
-        for connect in self._links:
-            row = persons.index(connect[0])
-            col = groups.index(connect[1])
-            
-            matrix[row][col] = 1
-            
+    # create the bipartite 2-mode graph from persons and groups as a sparse
+    # (CSR) incidence matrix with int32 indices, given the row (person) and
+    # column (group) of every link, in a single vectorized pass
+    def _getBipartiteGraph(self, rows, cols):
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        data = np.ones(len(rows), dtype=np.int32)
+        shape = (len(self._persons), len(self._groups))
+        
+        # repeated links are summed on conversion, so set them back to 1
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        matrix.sum_duplicates()
+        matrix.sort_indices()
+        matrix.data[:] = 1
         return matrix
     
     # get the person-to-group matrix (a list of lists)
+    # this is a dense export of the sparse incidence matrix, so it needs
+    # persons x groups memory
     def getPersonToGroupMatrix(self):
-        return self._getBipartiteGraph()  
+        return self._getIncidence().toarray().tolist()
     
     # get the person-to-group network as a networkx
     # useful for drawing the network    
     def getPersonToGroupNetworkX(self):
+        self._sync()
+        
         # create networkx person-to-group graph
         network = nx.Graph()
-        for link in self._links:
-            network.add_edge(link[0], link[1])
+        for i, k in zip(self._linkPersons.tolist(), self._linkGroups.tolist()):
+            network.add_edge(self._persons[i], self._groups[k])
             
         return network
     
@@ -129,121 +309,215 @@ class Network:
     
     # get the betweenness centrality of the person-to-group network
     def getBetweennessCentrality(self):
-        # create networkx person-to-group graph
-        network = self.getPersonToGroupNetworkX()
-            
-        # get betweenness centrality
-        result = nx.betweenness_centrality(network)
-        nodes = result.keys()
-        cent = []
-        for node in nodes:
-            cent.append(result[node])
-        return sum(cent)/len(cent)
+        result = self._cached('betweenness', lambda: self._getBetweenness(None, None))
+        return float(result.sum()) / len(result)
+    
+    # gets an estimate of the betweenness centrality of the person-to-group
+    # network from the searches from samples random persons and groups
+    # (pivots, at least 2), seed is the seed for choosing them
+    def getApproxBetweennessCentrality(self, samples=100, seed=None):
+        result = self._getBetweenness(samples, seed)
+        return float(result.sum()) / len(result)
+    
+    # returns the betweenness centrality of every person and every group as
+    # [persons, groups], two arrays in the order of getPersons and getGroups
+    # exact if samples is None, otherwise estimated from samples pivots
+    def getBetweennessCentralities(self, samples=None, seed=None):
+        if samples is None:
+            result = self._cached('betweenness', lambda: self._getBetweenness(None, None))
+        else:
+            result = self._getBetweenness(samples, seed)
+        return [result[:len(self._persons)].copy(), result[len(self._persons):].copy()]
+    
+    # Brandes' algorithm over the person-to-group network, persons first then 
+    # groups, the searches split between the workers
+    def _getBetweenness(self, samples, seed):
+        incidence = self._getIncidence()
+        adjacency = sparse.bmat([[None, incidence], [incidence.T, None]], format='csr')
+        arrays = (adjacency.indptr, adjacency.indices)
+        if samples is None:
+            return betweenness.betweennessCentrality(arrays, self._workers, samples, seed)
+        with self._stage('sampledBetweenness', sources=min(samples, adjacency.shape[0])):
+            return betweenness.betweennessCentrality(arrays, self._workers, samples, seed)
+    
+    # gets the component label of every person (the first len(persons)
+    # labels) and every group (the rest) in the person-to-group network, 
+    # found once with union-find over the links (see components)
+    def _getComponents(self):
+        return self._cached('components', lambda: components.componentLabels(self._linkPersons, self._linkGroups + len(self._persons), len(self._persons) + len(self._groups)))
+    
+    # gets the label of the largest component (most persons and groups)
+    # ties go to the component with the first person
+    def _getLargestLabel(self):
+        return int(np.argmax(np.bincount(self._getComponents())))
     
     # returns the set of nodes in the the largest component of the network
     def _getPersonsGroupsLargestComp(self):
-        matrix = self._getBipartiteGraph()
-        
-        graph = nx.Graph()
+        labels = self._getComponents()
+        largest = self._getLargestLabel()
         
-        # create 2-mode networkx graph
-        for i in range(len(self._persons)):
-            for k in range(len(self._groups)):
-                if matrix[i][k] == 1:
-                    graph.add_edge(self._persons[i], self._groups[k])
-        
-        # gets the largest component        
-        largest = max(nx.connected_components(graph), key=len)
-        return largest
+        persons = np.flatnonzero(labels[:len(self._persons)] == largest)
+        groups = np.flatnonzero(labels[len(self._persons):] == largest)
+        return set([self._persons[i] for i in persons] + [self._groups[k] for k in groups])
     
-    # returns the largest component as a new Network
+    # returns the largest component as a new Network, made by slicing the 
+    # links by component label
     def largestComponentToNetwork(self):
-        # find persons, groups in largest component
-        largest = self._getPersonsGroupsLargestComp()
-        persons = []
-        groups = []
-        for n in largest:
-            if n in self._persons:
-                persons.append(n)
-            else:
-                groups.append(n)
-        
-        # find edges in largest component            
-        edges = []
-        for p in persons:
-            for g in groups:
-                if [p,g] in self._links:
-                    edges.append([p,g])
-        return Network(edges)    
+        return self._cached('largest', self._buildLargestComponent)
     
+    def _buildLargestComponent(self):
+        labels = self._getComponents()
+        largest = self._getLargestLabel()
+        inPersons = labels[:len(self._persons)] == largest
+        inGroups = labels[len(self._persons):] == largest
+        
+        # new positions of the persons and groups that are kept
+        newPersons = np.cumsum(inPersons) - 1
+        newGroups = np.cumsum(inGroups) - 1
+        
+        keep = inPersons[self._linkPersons]
+        rows = newPersons[self._linkPersons[keep]]
+        cols = newGroups[self._linkGroups[keep]]
+        persons = [self._persons[i] for i in np.flatnonzero(inPersons)]
+        groups = [self._groups[k] for k in np.flatnonzero(inGroups)]
+        return Network._fromArrays(persons, groups, rows, cols, self._engine, self._workers, self._profiler)
     
     # returns a list containing the proportion of persons in largest component
     # and proportion of groups in largest component as [p, g]
     def getLargestProportion(self):
-        largest = self._getPersonsGroupsLargestComp()
+        updates = self._updates
+        if updates is not None and updates.componentsValid:
+            countP, countG = updates.getLargestSize()
+            return [countP/len(updates.memberships), countG/len(updates.members)]
         
-        countP = 0
-        countG = 0
+        labels = self._getComponents()
+        largest = self._getLargestLabel()
+        if updates is not None:
+            updates.setComponents(labels)
         
-        for n in largest:   # all the nodes in the largest component
-            if n in self._persons:
-                countP = countP + 1
-            elif n in self._groups:
-                countG = countG + 1
-            else:
-                print("Cannot find node:", n)
+        countP = int(np.count_nonzero(labels[:len(self._persons)] == largest))
+        countG = int(np.count_nonzero(labels[len(self._persons):] == largest))
                 
         return [countP/len(self._persons), countG/len(self._groups)]
     
   
+    # creates the sparse (CSR) person-to-person matrix of co-enrollment counts
+    # using sparse matrix multiplication of the incidence matrix
+    # only the nonzero pairs of different persons are stored (no diagonal)
+    def _getProjection(self):
+        return self._cached('projection', self._buildProjection)
+    
+    def _buildProjection(self):
+        matrix = self._getIncidence()
+        matrix = matrix @ matrix.T
+        matrix.setdiag(0)
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        return matrix
+    
     # creates the person-to-person matrix (list of lists) using matrix
     # multiplication
     def getPersonToPerson(self):
-        matrix = np.array(self.getPersonToGroupMatrix())
-        return np.dot(matrix, np.transpose(matrix)).tolist()
+        matrix = self._getIncidence()
+        return (matrix @ matrix.T).toarray().tolist()
     
     # creates the binary person-to-person matrix (list of lists) by
     # dichotomizing the person-to-person matrix
     def getBinPersonToPerson(self):
-        matrix = np.array(self.getPersonToPerson())
-        return np.where(matrix > 0, 1, 0).tolist()
+        matrix = self._getIncidence()
+        matrix = matrix @ matrix.T
+        matrix.data[:] = 1
+        return matrix.toarray().tolist()
+    
+    # gets the person-to-person edges as a list of lists of the form
+    # [person, person, co-enrollments], one for each pair of persons that
+    # share at least one group
+    def getPersonToPersonEdges(self):
+        upper = sparse.triu(self._getProjection(), k=1, format='coo')
+        return [[self._persons[i], self._persons[k], count] for i, k, count in zip(upper.row.tolist(), upper.col.tolist(), upper.data.tolist())]
     
     # counts all the coenrollments in the person-to-person matrix and 
     # averages them over all persons
+    # a group of size s adds s(s - 1) coenrollments, so the total comes from
+    # the group sizes without the person-to-person matrix
     def getMeanCoEnrollments(self):
-        total = 0
-        network = self.getPersonToPerson()
-        for i in range(len(network)):
-            for k in range(len(network)):
-                if i != k:
-                    total = total + network[i][k]
-                    
-        return total / len(network)
+        if self._updates is not None:
+            return self._updates.coEnrollments / len(self._updates.memberships)
+        
+        self._sync()
+        sizes = np.bincount(self._linkGroups, minlength=len(self._groups)).astype(np.int64)
+        total = int(np.dot(sizes, sizes - 1))
+        return total / len(self._persons)
     
     # counts all the unique coenrollments (neighbors) in the binary 
     # person-to-person graph and averages them over all persons
+    # (with at least one coenrollment)
     def getMeanUniqueCoEnrollments(self):
-        total = 0
-        for n in self._network:
-            # self._network[n] is the adjacency dictionary of node n
-            result = [n for n in self._network[n]]
-            #print(result)
-            amount = len(result)
-            total = total + amount            
-                    
-        return total / len(self._network)
-    
-    # counts the number of edges (links) between persons (binary)
+        if self._updates is not None:
+            return 2 * self._updates.uniqueEdges / self._updates.connected
+        
+        degrees = self.getUniqueCoEnrollments()
+        return int(degrees.sum()) / int(np.count_nonzero(degrees))
+    
+    # returns the number of coenrollments of every person as an array in the
+    # order of getPersons, the sum of (size - 1) over the person's groups
+    def getCoEnrollments(self):
+        self._sync()
+        sizes = np.bincount(self._linkGroups, minlength=len(self._groups)).astype(np.int64)
+        return np.bincount(self._linkPersons, weights=(sizes - 1)[self._linkGroups], minlength=len(self._persons)).astype(np.int64)
+    
+    # returns the number of unique coenrollments (neighbors in the binary 
+    # person-to-person graph) of every person as an array in the order of
+    # getPersons
+    def getUniqueCoEnrollments(self):
+        return np.diff(self._getProjection().indptr).astype(np.int64)
+    
+    # returns a dictionary of summaries of the coenrollments and unique
+    # coenrollments of the persons, with keywords 'coEnrollments' and 
+    # 'uniqueCoEnrollments', each a dictionary with keywords 'mean', 'min', 
+    # 'max' and the given percentiles (such as 'p50' for the median)
+    def getCoEnrollmentSummary(self, percentiles=[25, 50, 75, 90, 99]):
+        summary = {}
+        for name, values in [['coEnrollments', self.getCoEnrollments()], ['uniqueCoEnrollments', self.getUniqueCoEnrollments()]]:
+            stats = {'mean': float(values.mean()), 'min': int(values.min()), 'max': int(values.max())}
+            for q, value in zip(percentiles, np.percentile(values, percentiles).tolist()):
+                stats['p%g' % (q)] = value
+            summary[name] = stats
+        return summary
+    
+    # counts the number of edges (links) between persons (binary), from the
+    # pairs stored in the person-to-person matrix (each edge twice)
     def getUniqueEdges(self):
-        return self._network.size()
+        if self._updates is not None:
+            return self._updates.uniqueEdges
+        return int(self._getProjection().nnz) // 2
     
-    # gets the network density (binary)
+    # gets the network density (binary), over the persons with at least one
+    # co-enrollment (the nodes of the binary network)
     def getNetworkDensity(self):
-        return nx.density(self._network)
+        if self._updates is not None:
+            edges = self._updates.uniqueEdges
+            n = self._updates.connected
+        else:
+            edges = self.getUniqueEdges()
+            n = int(np.count_nonzero(self.getUniqueCoEnrollments()))
+        return 2 * edges / (n * (n - 1)) if n > 1 else 0
     
-    # gets the average clustering coefficient (binary)
+    # gets the average clustering coefficient (binary), over the persons 
+    # with at least one co-enrollment
     def getAverageClusterCoeff(self):
-        return nx.average_clustering(self._network)
+        coefficients = self._getClustering()
+        connected = np.diff(self._getProjection().indptr) > 0
+        return float(coefficients[connected].sum()) / int(np.count_nonzero(connected))
+    
+    # returns the clustering coefficient of every person (binary) as an
+    # array, in the order of getPersons
+    def getClusterCoeffs(self):
+        return self._getClustering().copy()
+    
+    def _getClustering(self):
+        projection = self._getProjection()
+        return self._cached('clustering', lambda: clustering.clusteringCoefficients(projection.indptr, projection.indices))
     
     # gets the characteristic path length, the average distance between
     # persons (binary)
@@ -254,8 +528,24 @@ class Network:
     
     # gets the network diameter (binary)
     # does NOT work for a graph that is not connected, returns -1 if error
+    # uses the distance histogram if the other path metrics have already been
+    # found, otherwise the bounding search in getBoundedDiameter
     def getNetworkDiameter(self):
-        return self._getData(0)['diameter']
+        if 'histogram' in self._cache:
+            return self._getData(0)['diameter']
+        return self.getBoundedDiameter()['diameter']
+    
+    # gets the exact network diameter (binary) by bounding the eccentricities
+    # of the persons (see paths.boundedDiameter), which usually needs only a
+    # few searches rather than one from every person
+    # returns a dictionary with keywords 'diameter' (-1 if the graph is not
+    # connected) and 'searches' (the number of searches run)
+    def getBoundedDiameter(self):
+        arrays = self._getSearchArrays()
+        with self._stage('boundedDiameter') as record:
+            diameter, searches = paths.boundedDiameter(arrays)
+            record['counts']['sources'] = searches
+        return {'diameter': diameter, 'searches': searches}
         
     # get the k-step reach of the proportion of person pairs that can be 
     # linked in k steps, 
@@ -267,108 +557,671 @@ class Network:
         else:
             return result[k]
     
+    # estimates the characteristic path length from searches started at a
+    # random sample of persons instead of every person
+    # samples is the number of persons searched, or if tolerance is given,
+    # persons are searched until the half-width of the confidence interval is
+    # at most tolerance; seed makes the sample repeatable
+    # returns a dictionary with keywords 'path', 'low', 'high' (the bounds of
+    # the confidence interval) and 'samples' (the number of persons searched)
+    # if a search finds the graph is not connected, all of them are -1.0
+    def getApproxCharPathLength(self, samples=100, tolerance=None, confidence=0.95, seed=None):
+        means, reaches, connected = self._getSample(0, samples, tolerance, confidence, seed)
+        if not connected:
+            return {'path': -1.0, 'low': -1.0, 'high': -1.0, 'samples': len(means)}
+        
+        estimate = paths.estimateMean(means, len(self._persons), confidence)
+        return {'path': estimate[0], 'low': estimate[1], 'high': estimate[2], 'samples': len(means)}
+    
+    # estimates the k-step reach from searches started at a random sample of
+    # persons (samples, tolerance and seed as in getApproxCharPathLength)
+    # returns a dictionary with keywords 'reach', 'low', 'high' and 'samples',
+    # if multiple is true, 'reach', 'low' and 'high' are lists for 
+    # 0, 1, 2, 3, ... k
+    def getApproxKStepReach(self, k, multiple=False, samples=100, tolerance=None, confidence=0.95, seed=None):
+        means, reaches, connected = self._getSample(k, samples, tolerance, confidence, seed)
+        estimates = [paths.estimateMean(reaches[:, x], len(self._persons), confidence) for x in range(k+1)]
+        
+        result = {'samples': len(means)}
+        for i, key in enumerate(['reach', 'low', 'high']):
+            values = [estimate[i] for estimate in estimates]
+            result[key] = values if multiple else values[k]
+        return result
+    
+    # gets lower and upper bounds on the network diameter from double-sweep
+    # searches started at sweeps random persons (seed makes them repeatable)
+    # returns a dictionary with keywords 'lower', 'upper' and 'searches' (the
+    # number of searches run), the bounds are -1 if the graph is not connected
+    def getApproxNetworkDiameter(self, sweeps=4, seed=None):
+        self._sync()
+        rng = np.random.default_rng(seed)
+        starts = rng.choice(len(self._persons), size=min(sweeps, len(self._persons)), replace=False)
+        arrays = self._getSearchArrays()
+        with self._stage('diameterSweeps') as record:
+            lower, upper, searches = paths.diameterBounds(arrays, starts)
+            record['counts']['sources'] = searches
+        return {'lower': lower, 'upper': upper, 'searches': searches}
+    
+    # gets the persons reachable from person in at most k steps (persons who
+    # share a group are one step apart) as a dictionary with keywords 'count'
+    # (the number of them, not counting person), 'persons' (their names),
+    # 'groups' (the names of the groups the steps go through) and 'counts'
+    # (the numbers first reached in 1, 2, ... k steps, as a list)
+    def getPersonReach(self, person, k):
+        personLevels, groupLevels = self._getLevels(self._getPersonId(person), k)
+        reached = np.concatenate([personLevels[0][:0]] + personLevels[1:k+1])
+        through = np.concatenate([personLevels[0][:0]] + groupLevels[:k])
+        counts = [len(level) for level in personLevels[1:k+1]]
+        counts = counts + [0] * (k - len(counts))
+        return {'count': len(reached), 'persons': [self._persons[i] for i in np.sort(reached).tolist()],
+                'groups': [self._groups[i] for i in np.sort(through).tolist()], 'counts': counts}
+    
+    # gets the ego network data of person as a dictionary with keywords 
+    # 'groups' (the number of groups of person), 'degree' (unique
+    # co-enrollments), 'coEnrollments' and 'clustering' (the clustering
+    # coefficient of person in the binary person-to-person network), found
+    # from the groups of person and of their neighbors only
+    # the data is kept with the person's search, so asking again is free
+    def getPersonStats(self, person):
+        entry = self._getQuery(self._getPersonId(person), 1)
+        if entry[2] is None:
+            entry[2] = self._egoStats(entry[0])
+        return dict(entry[2])
+    
+    def _egoStats(self, levels):
+        personLevels, groupLevels = levels
+        groupPtr = self._getBipartiteArrays()[2]
+        neighbors = personLevels[1]
+        groups = groupLevels[0]
+        sizes = (groupPtr[groups + 1] - groupPtr[groups]).astype(np.int64)
+        
+        # links between the neighbors are the off-diagonal nonzeros of the
+        # co-enrollments of the neighbors among themselves
+        degree = len(neighbors)
+        coefficient = 0.0
+        if degree > 1:
+            sub = self._getIncidence()[neighbors]
+            pairs = sub @ sub.T
+            links = (pairs.nnz - np.count_nonzero(pairs.diagonal())) // 2
+            coefficient = 2 * links / (degree * (degree - 1))
+        return {'groups': len(groups), 'degree': degree, 'coEnrollments': int((sizes - 1).sum()), 'clustering': coefficient}
+    
+    # gets a shortest path from the person source to the person target as a
+    # list of names going person, group, person, ... target, where each group
+    # is shared by the persons on either side of it, or [] if target cannot be
+    # reached from source
+    def getConnectingPath(self, source, target):
+        first = self._getPersonId(source)
+        last = self._getPersonId(target)
+        levels = self._getLevels(first, len(self._persons), last)
+        for d, level in enumerate(levels[0]):
+            if np.isin(last, level):
+                persons, groups = paths.levelPath(*self._getBipartiteArrays(), levels, last, d)
+                path = [self._persons[persons[0]]]
+                for group, person in zip(groups, persons[1:]):
+                    path.extend([self._groups[group], self._persons[person]])
+                return path
+        return []
+    
+    # gets the ID of the person, who must be in the Network
+    def _getPersonId(self, person):
+        self._sync()
+        if person not in self._personIds:
+            raise Exception("Unknown person: %s" % (person))
+        return self._personIds[person]
+    
+    # gets the levels of a search from the person source for k steps, or
+    # until target is reached (see paths.bipartiteLevels), carrying on from
+    # the kept search of source if there is one
+    def _getLevels(self, source, k, target=None):
+        return self._getQuery(source, k, target)[0]
+    
+    # gets the kept search of the person source as [levels, IDs held, ego
+    # stats (None until asked for)], searching further if needed (see
+    # _getLevels)
+    # the searches are kept in least recently used order, the oldest are
+    # dropped when there are more than QUERY_CACHE_SIZE of them or they hold
+    # more than QUERY_CACHE_IDS person and group IDs
+    def _getQuery(self, source, k, target=None):
+        queries = self._cached('queries', _Queries)
+        entry = queries.pop(source, None)
+        if entry is not None:
+            queries.held = queries.held - entry[1]
+        if entry is None or self._searchMore(entry[0], k, target):
+            with self._stage('query', sources=1) as record:
+                levels = paths.bipartiteLevels(*self._getBipartiteArrays(), source, k, entry[0] if entry else None, target)
+                record['counts']['persons'] = sum(len(level) for level in levels[0])
+            entry = [levels, sum(len(level) for level in levels[0] + levels[1]), entry[2] if entry else None]
+        queries[source] = entry
+        queries.held = queries.held + entry[1]
+        
+        while len(queries) > 1 and (len(queries) > QUERY_CACHE_SIZE or queries.held > QUERY_CACHE_IDS):
+            queries.held = queries.held - queries.popitem(last=False)[1][1]
+        return entry
+    
+    # returns whether kept levels stop short of k steps, or of target, with
+    # more persons left to reach
+    def _searchMore(self, levels, k, target):
+        personLevels = levels[0]
+        if len(personLevels) - 1 >= k or len(personLevels[-1]) == 0:
+            return False
+        return target is None or not np.isin(target, np.concatenate(personLevels))
+    
+    # gets the arrays of the person-to-group links (see paths): the
+    # incidence matrix and its transpose, the members of each group
+    def _getBipartiteArrays(self):
+        incidence = self._getIncidence()
+        members = self._cached('members', lambda: incidence.T.tocsr(copy=True))
+        return (incidence.indptr, incidence.indices, members.indptr, members.indices)
+    
+    # gets the small-world sigma and omega of the largest component, with
+    # confidence intervals, against an ensemble of members randomized
+    # Networks with the same numbers of groups per person and persons per
+    # group (see nullModel.smallWorld for the dictionary returned)
+    # rounds is the number of rounds of link swaps for each member, seed
+    # makes the ensemble repeatable, and samples, if given, estimates the
+    # path lengths from that many random persons; members are split between
+    # the Network's workers
+    def getSmallWorld(self, members=20, rounds=20, confidence=0.95, seed=None, samples=None):
+        with self._stage('smallWorld', members=members):
+            return nullModel.smallWorld(self, members, rounds, confidence, seed, samples, self._workers)
+    
+    # gets the per-source statistics of searches from a random sample of
+    # persons (see paths.sampleStats)
+    def _getSample(self, k, samples, tolerance, confidence, seed):
+        self._sync()
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self._persons))
+        arrays = self._getSearchArrays()
+        with self._stage('sample') as record:
+            result = paths.sampleStats(arrays, order, k, samples, tolerance, confidence)
+            record['counts']['sources'] = len(result[0])
+        return result
+    
     # gets the characteristic path length, network diameter, and k-step reach
-    # all at once to reduce calculation time
+    # all at once from the distance histogram
     # returns a dictionary with keywords 'path', 'diameter' and 'reach' 
     # associated with the results
     # if graph is not connected, 'path' is -1.0 and diameter is -1
     def _getData(self, k):
-        path = dict(nx.all_pairs_shortest_path_length(self._network))
-        totalLen = 0        # sum of the path lengths or -1.0
-        numPairs = 0        # total number of node pairs
-        count = [0]*(k+1)   # pair count for k-step reach
-        diameter = 0        # diameter
-        
-        result = {}         # result dictionary
-        
-        for i in range(len(self._persons)):
-            for j in range(i+1, len(self._persons)):
-                n = self._persons[i]
-                m = self._persons[j]
-                numPairs = numPairs + 1
-
-                try:
-                    # to calculate characteristic path length
-                    if totalLen >= 0:
-                        totalLen = totalLen + path[n][m]
-                    # to determine diameter
-                    if diameter >= 0 and path[n][m] > diameter:
-                        diameter = path[n][m]
-                    # to calculate k-step reach
-                    for x in range(1, k+1): # always 0 for k=0
-                        if path[n][m] <= x:
-                            count[x] = count[x] + 1
-                except: # graph is not connected
-                    totalLen = -1.0
-                    diameter = -1
-        
-        # calculate results         
-        for i in range(len(count)):
-            count[i] = count[i] / numPairs
-        result['reach'] = count
-        if totalLen >= 0:
-            result['path'] = totalLen / numPairs
-        else:
-            result['path'] = -1.0
-        result['diameter'] = diameter
+        return paths.histogramData(self._getHistogram(), len(self._persons), k)
+    
+    # gets the distance histogram [counts, unreachable] of all pairs of
+    # persons (see paths.distanceHistogram) with one breadth-first search from
+    # each person, using the Network's engine and worker processes
+    # the histogram is kept, so every path metric after the first is free
+    def _getHistogram(self):
+        self._sync()
+        sources = np.arange(len(self._persons))
+        build = lambda: paths.parallelDistanceHistogram(self._getSearchArrays(), sources, self._workers)
+        return self._cached('histogram', build, sources=len(sources), pairs=len(sources) * (len(sources) - 1))
+    
+    # gets the arrays searched by the Network's engine (see paths)
+    def _getSearchArrays(self):
+        if self._engine == 'bipartite':
+            return self._getBipartiteArrays()
         
-        return result
+        projection = self._getProjection()
+        return (projection.indptr, projection.indices)
+            
+        
+    # adds a link between person and group, both of which may be new
+    def addLink(self, person, group):
+        updates = self._startUpdates()
+        if group in updates.memberships.get(person, ()):
+            return
+        self._fingerprint = (self._fingerprint + fingerprint.linkHash(person, group)) & fingerprint.MASK
+        
+        graph = self._cache.get('graph')
+        for other in updates.addLink(person, group):
+            if graph is not None:
+                graph.add_edge(person, other)
+    
+    # removes the link between person and group, a person or group left 
+    # without links is removed from the Network
+    def removeLink(self, person, group):
+        updates = self._startUpdates()
+        if group not in updates.memberships.get(person, ()):
+            raise Exception("No link between %s and %s." % (person, group))
+        self._fingerprint = (self._fingerprint - fingerprint.linkHash(person, group)) & fingerprint.MASK
+        
+        graph = self._cache.get('graph')
+        for other in updates.removeLink(person, group):
+            if graph is not None:
+                graph.remove_edge(person, other)
+                for node in (person, other):
+                    if graph.degree(node) == 0:
+                        graph.remove_node(node)
+    
+    # adds a person with links to each of the groups
+    def addPerson(self, person, groups):
+        for group in groups:
+            self.addLink(person, group)
+    
+    # adds a group with links to each of the persons
+    def addGroup(self, group, persons):
+        for person in persons:
+            self.addLink(person, group)
+    
+    # removes a person and all their links
+    def removePerson(self, person):
+        updates = self._startUpdates()
+        for group in list(updates.memberships.get(person, ())):
+            self.removeLink(person, group)
+    
+    # removes a group and all its links
+    def removeGroup(self, group):
+        updates = self._startUpdates()
+        for person in list(updates.members.get(group, ())):
+            self.removeLink(person, group)
+    
+    # gets the state for changing links in place, set up from the links on
+    # the first change
+    def _startUpdates(self):
+        if self._updates is None:
+            incidence = self._getIncidence()
+            degrees = self.getUniqueCoEnrollments()
+            updates = _Updates(self._persons, self._groups, incidence, degrees, int(self.getCoEnrollments().sum()))
+            if 'components' in self._cache:
+                updates.setComponents(self._getComponents())
+            self._updates = updates
+            
+            # the source files no longer describe the Network
+            self._sourceHash = None
+        self._updates.pending = True
+        return self._updates
+    
+    # rebuilds the persons, groups and links from the changed links, if there
+    # have been changes since the last rebuild
+    # the binary network is kept (it is kept up to date), the incidence is 
+    # made from the sorted links, the projection is renumbered and given the
+    # changed co-enrollment counts, the components are taken from the
+    # union-find while it is valid, and the clustering is found again for
+    # the persons it changed for; the rest of the cache is cleared
+    def _sync(self):
+        updates = self._updates
+        if updates is None or not updates.pending:
+            return
+        
+        with self._stage('sync') as record:
+            persons = sorted(updates.memberships)
+            groups = sorted(updates.members)
+            groupIds = {name: i for i, name in enumerate(groups)}
+            rows = []
+            cols = []
+            for i, person in enumerate(persons):
+                for group in sorted(updates.memberships[person]):
+                    rows.append(i)
+                    cols.append(groupIds[group])
+            record['counts']['links'] = len(rows)
+        
+            old = self._cache
+            oldPersons = self._persons
+            rows = np.array(rows, dtype=np.int32)
+            cols = np.array(cols, dtype=np.int32)
+            self._build(persons, groups, rows, cols, self._fingerprint)
+            if 'graph' in old:
+                self._cache['graph'] = old['graph']
+            
+            # the links are sorted by person then group, and each is once
+            indptr = np.zeros(len(persons) + 1, dtype=np.int32)
+            np.cumsum(np.bincount(rows, minlength=len(persons)), out=indptr[1:])
+            self._cache['incidence'] = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), cols, indptr), shape=(len(persons), len(groups)))
             
+            # new ID of each person before the changes, -1 for those removed
+            renumber = np.array([self._personIds.get(name, -1) for name in oldPersons], dtype=np.int32)
+            if 'projection' in old:
+                self._cache['projection'] = self._changeProjection(old['projection'], renumber, updates.pairs)
+                if 'clustering' in old:
+                    self._cache['clustering'] = self._changeClustering(old['clustering'], renumber, updates.linked)
+            if updates.componentsValid:
+                self._cache['components'] = updates.getLabels()
+        updates.pairs = {}
+        updates.linked = set()
+        updates.pending = False
+        self._updates = updates
+    
+    # returns the projection of the changed links, given the projection
+    # before the changes, the new ID of each person in it, and the change in
+    # co-enrollments of each pair of persons (by name, see _Updates)
+    # both lists of persons are sorted, so the persons kept are in the same
+    # order and every row stays sorted when renumbered; persons removed
+    # since have no co-enrollments left, so their entries are dropped
+    def _changeProjection(self, projection, renumber, pairs):
+        ids = self._personIds
+        count = len(self._persons)
+        indices = renumber[projection.indices]
+        data = projection.data
+        sizes = np.diff(projection.indptr)
+        if np.any(renumber < 0):
+            rows = np.repeat(renumber, sizes)
+            kept = (rows >= 0) & (indices >= 0)
+            indices = indices[kept]
+            data = data[kept]
+            sizes = np.bincount(rows[kept], minlength=count)
+        else:
+            moved = np.zeros(count, dtype=sizes.dtype)
+            moved[renumber] = sizes
+            sizes = moved
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(sizes, out=indptr[1:])
+        matrix = sparse.csr_matrix((data.copy(), indices, indptr), shape=(count, count))
+        
+        # each change is to both halves of the symmetric matrix
+        changes = [[ids[first], ids[second], change] for (first, second), change in pairs.items()
+                   if change != 0 and first in ids and second in ids]
+        changes = np.array(changes, dtype=np.int64).reshape(-1, 3)
+        rows = np.concatenate([changes[:, 0], changes[:, 1]])
+        cols = np.concatenate([changes[:, 1], changes[:, 0]])
+        values = np.concatenate([changes[:, 2], changes[:, 2]]).astype(data.dtype)
+        matrix = matrix + sparse.csr_matrix((values, (rows, cols)), shape=(count, count))
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        return matrix
+    
+    # returns the clustering coefficients of the changed links (the
+    # projection is already changed), given the coefficients before the
+    # changes, the new ID of each person in them, and the pairs of persons
+    # linked or unlinked (by name, see _Updates)
+    # a person's coefficient only changes if they were linked or unlinked,
+    # or are linked to both persons of a pair that was
+    def _changeClustering(self, before, renumber, linked):
+        ids = self._personIds
+        projection = self._cache['projection']
+        indptr = projection.indptr
+        indices = projection.indices
+        coefficients = np.zeros(len(self._persons), dtype=float)
+        kept = renumber >= 0
+        coefficients[renumber[kept]] = before[kept]
         
+        changed = set()
+        for first, second in linked:
+            if first in ids and second in ids:
+                a = ids[first]
+                b = ids[second]
+                changed.update([a, b])
+                changed.update(np.intersect1d(indices[indptr[a]:indptr[a+1]], indices[indptr[b]:indptr[b+1]], assume_unique=True).tolist())
+            else:
+                changed.update(ids[name] for name in (first, second) if name in ids)
+        rows = np.array(sorted(changed), dtype=np.int64)
+        coefficients[rows] = clustering.clusteringCoefficients(indptr, indices, rows)
+        return coefficients
+    
+    # returns a dictionary of all the data printed by printNetworkData, with
+    # keywords 'persons', 'groups', 'proportionPersons', 'proportionGroups',
+    # 'betweenness', 'wholeNetwork' (True if the whole network is connected,
+    # otherwise the rest are for the largest component), 'componentPersons',
+    # 'componentGroups', 'meanCoEnrollments', 'meanUniqueCoEnrollments',
+    # 'uniqueEdges', 'density', 'clustering', 'charPathLength', 'diameter', 
+    # and 'reach1' through 'reach4'
+    # if timings (a dictionary) is given, the seconds spent on each stage are
+    # added to it with keywords 'components', 'betweenness', 'coEnrollments',
+    # 'clustering' and 'paths'
+    def getNetworkData(self, timings=None):
+        data = {}
+        compData = _timed(timings, 'components', self.getLargestProportion)
+        data['persons'] = len(self.getPersons())
+        data['groups'] = len(self.getGroups())
+        data['proportionPersons'] = compData[0]
+        data['proportionGroups'] = compData[1]
+        data['betweenness'] = _timed(timings, 'betweenness', self.getBetweennessCentrality)
+        
+        data['wholeNetwork'] = compData[0] == 1.0 and compData[1] == 1.0
+        if data['wholeNetwork']:
+            comp = self
+        else:
+            comp = _timed(timings, 'components', self.largestComponentToNetwork)
+        data['componentPersons'] = len(comp.getPersons())
+        data['componentGroups'] = len(comp.getGroups())
+        data['meanCoEnrollments'] = _timed(timings, 'coEnrollments', comp.getMeanCoEnrollments)
+        data['meanUniqueCoEnrollments'] = _timed(timings, 'coEnrollments', comp.getMeanUniqueCoEnrollments)
+        data['uniqueEdges'] = _timed(timings, 'coEnrollments', comp.getUniqueEdges)
+        data['density'] = _timed(timings, 'coEnrollments', comp.getNetworkDensity)
+        data['clustering'] = _timed(timings, 'clustering', comp.getAverageClusterCoeff)
+        result = _timed(timings, 'paths', lambda: comp._getData(4))
+        data['charPathLength'] = result['path']
+        data['diameter'] = result['diameter']
+        for k in range(1, 5):
+            data['reach%d' % (k)] = result['reach'][k]
+        return data
+    
     # print all data for network for largest component
     def printNetworkData(self):
+        data = self.getNetworkData()
         print()
         print("Person-to-Group Data:")
         print("----------------------------------------")
-        compData = self.getLargestProportion()
-        print("Persons:                     %10d"     % (len(self.getPersons())))
-        print("Groups:                      %10d"     % (len(self.getGroups())))
-        print("Proportion of persons:       %10.5f"   % (compData[0]))
-        print("Proportion of groups:        %10.5f"   % (compData[1]))
-        print("Betweenness Centrality:      %10.5f\n" % (self.getBetweennessCentrality()))
-        if compData[0] == 1.0 and compData[1] == 1.0:
+        print("Persons:                     %10d"     % (data['persons']))
+        print("Groups:                      %10d"     % (data['groups']))
+        print("Proportion of persons:       %10.5f"   % (data['proportionPersons']))
+        print("Proportion of groups:        %10.5f"   % (data['proportionGroups']))
+        print("Betweenness Centrality:      %10.5f\n" % (data['betweenness']))
+        if data['wholeNetwork']:
             print("Person-to-Person Whole Network Data:")
             print("----------------------------------------")
-            print("Mean co-enrollements:        %10.5f"   % (self.getMeanCoEnrollments()))
-            print("Mean unique co-enrollements: %10.5f"   % (self.getMeanUniqueCoEnrollments()))   
-            print("Unique edges (links):        %10d"     % (self.getUniqueEdges()))
-            print("Network density:             %10.5f"   % (self.getNetworkDensity()))
-            print("Clustering coefficient:      %10.5f"   % (self.getAverageClusterCoeff())) 
-            result = self._getData(4)
-            print("Characteristic path length:  %10.5f"   % (result['path']))
-            print("Network diameter:            %10d"     % (result['diameter']))
-            print("1-step reach:                %10.5f"   % (result['reach'][1]))
-            print("2-step reach:                %10.5f"   % (result['reach'][2]))
-            print("3-step reach:                %10.5f"   % (result['reach'][3]))
-            print("4-step reach:                %10.5f\n" % (result['reach'][4]))              
-        
         else:
-            comp = self.largestComponentToNetwork()
             print("Person-to-Person Largest Component Data:")
             print("----------------------------------------")
-            print("Persons:                     %10d"     % (len(comp.getPersons())))
-            print("Groups:                      %10d"     % (len(comp.getGroups())))
-            print("Mean co-enrollements:        %10.5f"   % (comp.getMeanCoEnrollments()))
-            print("Mean unique co-enrollements: %10.5f"   % (comp.getMeanUniqueCoEnrollments()))   
-            print("Unique edges (links):        %10d"     % (comp.getUniqueEdges()))
-            print("Network density:             %10.5f"   % (comp.getNetworkDensity()))
-            print("Clustering coefficient:      %10.5f"   % (comp.getAverageClusterCoeff())) 
-            result = comp._getData(4)
-            print("Characteristic path length:  %10.5f"   % (result['path']))
-            print("Network diameter:            %10d"     % (result['diameter']))
-            print("1-step reach:                %10.5f"   % (result['reach'][1]))
-            print("2-step reach:                %10.5f"   % (result['reach'][2]))
-            print("3-step reach:                %10.5f"   % (result['reach'][3]))
-            print("4-step reach:                %10.5f\n" % (result['reach'][4]))  
+            print("Persons:                     %10d"     % (data['componentPersons']))
+            print("Groups:                      %10d"     % (data['componentGroups']))
+        print("Mean co-enrollements:        %10.5f"   % (data['meanCoEnrollments']))
+        print("Mean unique co-enrollements: %10.5f"   % (data['meanUniqueCoEnrollments']))   
+        print("Unique edges (links):        %10d"     % (data['uniqueEdges']))
+        print("Network density:             %10.5f"   % (data['density']))
+        print("Clustering coefficient:      %10.5f"   % (data['clustering'])) 
+        print("Characteristic path length:  %10.5f"   % (data['charPathLength']))
+        print("Network diameter:            %10d"     % (data['diameter']))
+        print("1-step reach:                %10.5f"   % (data['reach1']))
+        print("2-step reach:                %10.5f"   % (data['reach2']))
+        print("3-step reach:                %10.5f"   % (data['reach3']))
+        print("4-step reach:                %10.5f\n" % (data['reach4']))
         
         
     # two Networks are equal if they have the same persons, groups, and links,
-    # the latter is tested by comparing the person-to-group matrix
+    # Networks with different fingerprints are not, otherwise the latter is
+    # tested by comparing the sparse person-to-group matrices
     # this does not determine if two Networks are isomorphic
     def __eq__(self, other):
         if isinstance(other, Network):
+            if self._fingerprint != other._fingerprint:
+                return False
             if self.getPersons() == other.getPersons():
-                if self.getGroups() == self.getGroups():
-                    if self.getPersonToGroupMatrix() == self.getPersonToGroupMatrix():
+                if self.getGroups() == other.getGroups():
+                    if (self._getIncidence() != other._getIncidence()).nnz == 0:
                         return True
         return False
+
+
+# returns function(), adding the seconds it took to timings[stage] if 
+# timings is not None
+def _timed(timings, stage, function):
+    start = time.perf_counter()
+    value = function()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+    return value
+
+# returns the counts recorded by the profiler for a cached structure
+def _countsOf(value):
+    if sparse.issparse(value):
+        return {'nonzeros': int(value.nnz)}
+    if isinstance(value, nx.Graph):
+        return {'nodes': value.number_of_nodes(), 'edges': value.number_of_edges()}
+    if isinstance(value, np.ndarray):
+        return {'items': int(value.size)}
+    if isinstance(value, Network):
+        return {'persons': len(value._persons), 'groups': len(value._groups)}
+    return {}
+
+# returns the approximate number of bytes held by a cached structure
+def _memoryOf(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sparse.issparse(value):
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    if isinstance(value, nx.Graph):
+        adjacency = value._adj
+        return sys.getsizeof(adjacency) + sum(sys.getsizeof(n) + sys.getsizeof(neighbors) for n, neighbors in adjacency.items())
+    if isinstance(value, Network):
+        return sum(_memoryOf(item) for item in value._cache.values()) + value._linkPersons.nbytes + value._linkGroups.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + _memoryOf(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_memoryOf(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# the searches kept for the person queries (see Network._getQuery), least
+# recently used first, and the number of IDs they hold altogether
+class _Queries(OrderedDict):
+    def __init__(self):
+        super().__init__()
+        self.held = 0
+
+
+# state of a Network whose links are changed in place: the groups of each
+# person and persons of each group (by name), the binary degree of each 
+# person, counts for the whole network, the change in co-enrollments of each
+# pair of persons and the pairs linked or unlinked since the last rebuild,
+# and a union-find over the persons and groups for the components
+class _Updates:
+    def __init__(self, persons, groups, incidence, degrees, coEnrollments):
+        self.memberships = {}
+        self.members = {name: set() for name in groups}
+        indptr = incidence.indptr
+        indices = incidence.indices.tolist()
+        for i, person in enumerate(persons):
+            mine = set(groups[k] for k in indices[indptr[i]:indptr[i+1]])
+            self.memberships[person] = mine
+            for group in mine:
+                self.members[group].add(person)
+        
+        self.degrees = dict(zip(persons, degrees.tolist()))
+        self.uniqueEdges = int(degrees.sum()) // 2
+        self.connected = int(np.count_nonzero(degrees))
+        self.coEnrollments = coEnrollments
+        self.pairs = {}
+        self.linked = set()
+        
+        self.componentsValid = False
+        self.pending = False
+    
+    # adds a link, returns the persons that became linked to person
+    def addLink(self, person, group):
+        mine = self.memberships.setdefault(person, set())
+        others = self.members.setdefault(group, set())
+        self.degrees.setdefault(person, 0)
+        
+        linked = []
+        for other in others:
+            self.pairs[(person, other)] = self.pairs.get((person, other), 0) + 1
+            if mine.isdisjoint(self.memberships[other]):
+                linked.append(other)
+                self.linked.add((person, other))
+                self._changeDegree(person, 1)
+                self._changeDegree(other, 1)
+                self.uniqueEdges = self.uniqueEdges + 1
+        self.coEnrollments = self.coEnrollments + 2 * len(others)
+        
+        mine.add(group)
+        others.add(person)
+        if self.componentsValid:
+            self._union(('p', person), ('g', group))
+        return linked
+    
+    # removes a link, returns the persons that are no longer linked to person
+    def removeLink(self, person, group):
+        mine = self.memberships[person]
+        others = self.members[group]
+        mine.discard(group)
+        others.discard(person)
+        
+        unlinked = []
+        for other in others:
+            self.pairs[(person, other)] = self.pairs.get((person, other), 0) - 1
+            if mine.isdisjoint(self.memberships[other]):
+                unlinked.append(other)
+                self.linked.add((person, other))
+                self._changeDegree(person, -1)
+                self._changeDegree(other, -1)
+                self.uniqueEdges = self.uniqueEdges - 1
+        self.coEnrollments = self.coEnrollments - 2 * len(others)
+        
+        if len(mine) == 0:
+            del self.memberships[person]
+            del self.degrees[person]
+        if len(others) == 0:
+            del self.members[group]
+        
+        # components cannot be split with union-find
+        self.componentsValid = False
+        return unlinked
+    
+    def _changeDegree(self, person, change):
+        before = self.degrees[person]
+        self.degrees[person] = before + change
+        if before == 0:
+            self.connected = self.connected + 1
+        elif before + change == 0:
+            self.connected = self.connected - 1
+    
+    # sets up the union-find from the component labels of a Network (persons
+    # first, then groups), where each set is a tree of [kind, name] nodes
+    def setComponents(self, labels):
+        persons = sorted(self.memberships)
+        groups = sorted(self.members)
+        nodes = [('p', name) for name in persons] + [('g', name) for name in groups]
+        
+        # sizes of each set as [persons, groups, first person], persons are
+        # in sorted order so the first one seen is the first person
+        self.parents = {}
+        self.sizes = {}
+        roots = {}
+        for node, label in zip(nodes, labels.tolist()):
+            root = roots.setdefault(label, node)
+            self.parents[node] = root
+            size = self.sizes.setdefault(root, [0, 0, None])
+            if node[0] == 'p':
+                size[0] = size[0] + 1
+                if size[2] is None:
+                    size[2] = node[1]
+            else:
+                size[1] = size[1] + 1
+        self.componentsValid = True
+    
+    # returns the component labels of the persons and then the groups (each
+    # in sorted order) from the union-find, numbered as by
+    # components.componentLabels
+    def getLabels(self):
+        nodes = [('p', name) for name in sorted(self.memberships)] + [('g', name) for name in sorted(self.members)]
+        roots = {}
+        labels = [roots.setdefault(self._find(node), len(roots)) for node in nodes]
+        return np.array(labels, dtype=np.int32)
+    
+    # returns [persons, groups] in the largest component, ties go to the 
+    # component with the first person
+    def getLargestSize(self):
+        most = max(size[0] + size[1] for size in self.sizes.values())
+        largest = min((size for size in self.sizes.values() if size[0] + size[1] == most), key=lambda size: size[2])
+        return largest[:2]
+    
+    def _find(self, node):
+        parents = self.parents
+        if node not in parents:
+            parents[node] = node
+            self.sizes[node] = [1, 0, node[1]] if node[0] == 'p' else [0, 1, None]
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+    
+    def _union(self, first, second):
+        first = self._find(first)
+        second = self._find(second)
+        if first == second:
+            return
+        sizeA = self.sizes.pop(first)
+        sizeB = self.sizes.pop(second)
+        self.parents[second] = first
+        firstPerson = min([name for name in (sizeA[2], sizeB[2]) if name is not None], default=None)
+        self.sizes[first] = [sizeA[0] + sizeB[0], sizeA[1] + sizeB[1], firstPerson]
@@ -0,0 +1,137 @@
+# Null models for small-world analysis: randomized versions of a Network's
+# person-to-group links that keep the number of groups of every person and
+# the number of persons in every group, and the small-world sigma and omega
+# found by comparing a Network with an ensemble of them.
+
+# Links are rewired with swaps: links (p1, g1) and (p2, g2) become (p1, g2)
+# and (p2, g1). Each round pairs up all the links at random and makes every
+# swap at once on the integer link arrays, dropping the swaps that would
+# repeat a link. The clustering coefficient and characteristic path length of
+# each randomized Network are found for its largest component, the same as
+# printNetworkData, and the members of the ensemble are split between worker
+# processes.
+
+# sigma = (C / Cr) / (L / Lr) and omega = Lr / L - C / Cl, where C and L are
+# the clustering and path length of the Network, Cr and Lr their means over
+# the ensemble, and Cl the clustering of a ring lattice with the same mean
+# number of neighbors k, 3(k - 2) / (4(k - 1)). The confidence intervals are
+# bootstrap intervals over the members of the ensemble.
+
+import numpy as np
+
+import paths
+
+# returns [rows, cols], the person and group IDs of randomly rewired links
+# after the given number of rounds of swaps (see above)
+def rewireLinks(rows, cols, rounds, rng):
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    count = len(rows)
+    if count < 2:
+        return [rows.astype(np.int32), cols.astype(np.int32)]
+    width = int(cols.max()) + 1
+
+    for i in range(rounds):
+        order = rng.permutation(count)
+        half = count // 2
+        first = order[:half]
+        second = order[half:2 * half]
+
+        # the links after each swap, which must not be links already, or be
+        # made twice in this round
+        newFirst = rows[first] * width + cols[second]
+        newSecond = rows[second] * width + cols[first]
+        keys = rows * width + cols
+        ok = (cols[first] != cols[second]) & ~np.isin(newFirst, keys) & ~np.isin(newSecond, keys)
+        made = np.concatenate((newFirst[ok], newSecond[ok]))
+        values, counts = np.unique(made, return_counts=True)
+        repeated = values[counts > 1]
+        ok[ok] = ~np.isin(newFirst[ok], repeated) & ~np.isin(newSecond[ok], repeated)
+
+        swapped = cols[first[ok]]
+        cols[first[ok]] = cols[second[ok]]
+        cols[second[ok]] = swapped
+    return [rows.astype(np.int32), cols.astype(np.int32)]
+
+# returns [clustering, path length] of the largest component of the
+# Network with the given links
+def componentMetrics(network, samples=None, seed=None):
+    comp = network.largestComponentToNetwork()
+    clustering = comp.getAverageClusterCoeff()
+    if samples is None:
+        path = comp.getCharPathLength()
+    else:
+        path = comp.getApproxCharPathLength(samples=samples, seed=seed)['path']
+    return [clustering, path]
+
+# returns the clustering coefficient of a ring lattice in which every node
+# has k neighbors
+def latticeClustering(k):
+    if k < 2:
+        return 0.0
+    return 3 * (k - 2) / (4 * (k - 1))
+
+# returns the [clustering, path length] of every member of an ensemble of
+# randomized Networks, one member for each seed, split between workers
+# arrays is (rows, cols, settings), where settings is [persons, groups,
+# rounds, samples] (samples is 0 for the exact path length)
+def ensembleMetrics(arrays, seeds, workers=1):
+    if workers <= 1 or len(seeds) < 2:
+        return _memberMetrics(arrays, seeds)
+    return np.concatenate(paths.mapChunks(_memberMetrics, arrays, np.asarray(seeds), workers))
+
+def _memberMetrics(arrays, seeds):
+    # imported here, since network imports this module
+    from network import Network
+
+    rows, cols, settings = arrays
+    persons, groups, rounds, samples = [int(value) for value in settings]
+    results = []
+    for seed in seeds:
+        rng = np.random.default_rng(int(seed))
+        newRows, newCols = rewireLinks(rows, cols, rounds, rng)
+        names = [list(range(persons)), list(range(groups))]
+        network = Network._fromArrays(names[0], names[1], newRows, newCols)
+        results.append(componentMetrics(network, samples if samples > 0 else None, int(seed)))
+    return np.array(results, dtype=float).reshape(len(results), 2)
+
+# returns [estimate, low, high] of statistic(indices) for the members of an
+# ensemble, where low and high bound the bootstrap percentile interval
+def bootstrap(statistic, members, confidence, rng, resamples=1000):
+    estimate = statistic(np.arange(members))
+    values = [statistic(rng.integers(0, members, members)) for i in range(resamples)]
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(values, [tail, 100 - tail])
+    return [float(estimate), float(low), float(high)]
+
+# returns the small-world data of a Network against an ensemble of members
+# randomized Networks with rounds rounds of swaps each (see above) as a
+# dictionary with keywords 'sigma', 'sigmaLow', 'sigmaHigh', 'omega',
+# 'omegaLow', 'omegaHigh', 'clustering', 'charPathLength',
+# 'randomClustering', 'randomCharPathLength', 'latticeClustering' and
+# 'members'
+# samples, if given, estimates the path lengths from searches from that many
+# random persons instead of from every person
+def smallWorld(network, members=20, rounds=20, confidence=0.95, seed=None, samples=None, workers=1):
+    comp = network.largestComponentToNetwork()
+    clustering, path = componentMetrics(comp, samples, seed)
+    degrees = comp.getUniqueCoEnrollments()
+    lattice = latticeClustering(float(degrees.mean()) if len(degrees) > 0 else 0)
+
+    rows, cols = comp._linkPersons, comp._linkGroups
+    settings = np.array([len(comp._persons), len(comp._groups), rounds, samples or 0], dtype=np.int64)
+    seeds = np.random.SeedSequence(seed).generate_state(members)
+    metrics = ensembleMetrics((rows, cols, settings), seeds, workers)
+
+    # a lattice without clustering (fewer than 2 neighbors) has no omega
+    rng = np.random.default_rng(seed)
+    sigma = lambda picked: (clustering / metrics[picked, 0].mean()) / (path / metrics[picked, 1].mean())
+    omega = lambda picked: metrics[picked, 1].mean() / path - (clustering / lattice if lattice > 0 else np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigmas = bootstrap(sigma, members, confidence, rng)
+        omegas = bootstrap(omega, members, confidence, rng)
+    return {'sigma': sigmas[0], 'sigmaLow': sigmas[1], 'sigmaHigh': sigmas[2],
+            'omega': omegas[0], 'omegaLow': omegas[1], 'omegaHigh': omegas[2],
+            'clustering': clustering, 'charPathLength': path,
+            'randomClustering': float(metrics[:, 0].mean()), 'randomCharPathLength': float(metrics[:, 1].mean()),
+            'latticeClustering': lattice, 'members': members}
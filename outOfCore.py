@@ -0,0 +1,440 @@
+# Out-of-core person-to-group networks, for networks whose person-to-person
+# network does not fit in memory (for example, several years of enrollments
+# at several institutions).
+
+# The links and the binary person-to-person adjacency live in files on disk
+# as CSR index arrays, read through memory maps, and only the names and
+# arrays with one entry a person or group (such as the CSR row pointers and
+# the search distances) are held in memory. The links are read a chunk at a
+# time (see loader.LinkStream) and written to disk as they are read, with
+# the IDs of the names in the order they are first seen, and then renumbered
+# in sorted order a block at a time. Each CSR array is built with an
+# external sort: keys are produced in chunks that fit within the memory
+# budget, each chunk is sorted and written to disk as a run, and the runs
+# are merged a block of each at a time, so repeated links and pairs are
+# dropped while the runs are merged. The person-to-person pairs are produced
+# group by group (every pair of members of a group), and the adjacency is
+# found by merging the pairs with their reverses.
+
+# The unique edges, density and mean (unique) co-enrollments come from the
+# group sizes and the adjacency row lengths, the components from union-find
+# over the links a chunk at a time, and the path metrics from searches that
+# read the adjacency (or the links, with the 'bipartite' engine, see
+# Network) through the memory maps. The methods have the same names,
+# arguments and results as those of Network.
+
+# Example:
+#   network = OutOfCoreNetwork('consortium.csv', directory='work', memoryBudget=1 << 30)
+#   print(network.getUniqueEdges(), network.getApproxCharPathLength(samples=200))
+
+from contextlib import nullcontext
+import itertools
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+import loader
+import paths
+
+# bytes of keys held in memory at a time, if no budget is given
+MEMORY_BUDGET = 1 << 28
+
+class OutOfCoreNetwork:
+    # creates an out-of-core network from edges as for Network (a file name,
+    # a list of file names, or a list of [person, group] lists), with its
+    # arrays in files in directory (a temporary directory, removed by close,
+    # if None)
+    # memoryBudget is the most bytes of keys held in memory at a time while
+    # building the arrays and scanning the links; engine, workers, memoryMap
+    # and profiler are as for Network, except that the files are read one at
+    # a time (workers are only used for the searches)
+    def __init__(self, edges, directory=None, memoryBudget=MEMORY_BUDGET, engine='projection', workers=1,
+                 memoryMap=False, profiler=None):
+        if engine not in ('projection', 'bipartite'):
+            raise Exception("Engine needs to be 'projection' or 'bipartite'.")
+        self._engine = engine
+        self._workers = workers if workers is not None else os.cpu_count()
+        self._profiler = profiler
+        self._budget = memoryBudget
+        self._temporary = directory is None
+        self._directory = tempfile.mkdtemp() if directory is None else directory
+        os.makedirs(self._directory, exist_ok=True)
+
+        # a network that cannot be built removes its temporary directory (or
+        # the links read, if the directory was given)
+        links = os.path.join(self._directory, 'links.bin')
+        try:
+            self._load(edges, memoryMap, links)
+        except BaseException:
+            if self._temporary:
+                shutil.rmtree(self._directory, ignore_errors=True)
+            elif os.path.exists(links):
+                os.remove(links)
+            raise
+
+        self._adjacency = None
+        self._labels = None
+        self._histogram = None
+
+    # reads the links of edges into the file links, and sorts them into the
+    # incidence and members
+    def _load(self, edges, memoryMap, links):
+        # the links as keys person << 32 | group, with the IDs of the chunks
+        # (see loader.LinkStream)
+        with self._stage('load') as record:
+            stream = loader.LinkStream(edges, memoryMap)
+            with open(links, 'wb') as output:
+                for rows, cols in stream:
+                    (rows.astype(np.int64) << 32 | cols).tofile(output)
+            self._persons, self._groups, personMap, groupMap = stream.getNames()
+            stats = stream.getStats()
+            record['counts'].update(files=stats['files'], rows=stats['rows'])
+
+        # the links sorted by person (the incidence) and by group (the
+        # members), without repeats
+        with self._stage('links', links=stats['rows']) as record:
+            self._personPtr, self._personIdx = self._sortedCsr('incidence', links, personMap, groupMap, False)
+            self._groupPtr, self._groupIdx = self._sortedCsr('members', links, personMap, groupMap, True)
+            os.remove(links)
+            stats['links'] = len(self._personIdx)
+            record['counts']['links'] = stats['links']
+        self._loadStats = stats
+
+    # returns the profiler stage (see profiler.Profiler.stage), or a stand-in
+    # if there is no profiler
+    def _stage(self, name, **counts):
+        if self._profiler is None:
+            return nullcontext({'counts': {}})
+        return self._profiler.stage(name, **counts)
+
+    # removes the files of the network if they are in a temporary directory
+    def close(self):
+        if self._temporary and os.path.exists(self._directory):
+            self._personIdx = self._groupIdx = self._adjacency = None
+            shutil.rmtree(self._directory)
+
+    # returns a dictionary of the names of the files of the network and the
+    # number of bytes in each
+    def getDiskInfo(self):
+        names = sorted(os.listdir(self._directory))
+        return {name: os.path.getsize(os.path.join(self._directory, name)) for name in names}
+
+    # return the statistics of reading the links (see loader.loadLinks)
+    def getLoadStats(self):
+        return dict(self._loadStats)
+
+    # return the list of persons
+    def getPersons(self):
+        return list(self._persons)
+
+    # return the list of groups
+    def getGroups(self):
+        return list(self._groups)
+
+    # returns [indptr, indices] of the CSR matrix of the links in the file
+    # links (see __init__), persons to groups or, if byGroup is true, groups
+    # to persons, with the IDs renumbered by personMap and groupMap, sorted
+    # on disk in the file name.bin; indptr is held in memory, indices is
+    # memory-mapped, and repeated links are kept once
+    def _sortedCsr(self, name, links, personMap, groupMap, byGroup):
+        count, width = (len(groupMap), len(personMap)) if byGroup else (len(personMap), len(groupMap))
+        keys = (_linkKeys(block, personMap, groupMap, byGroup) for block in readBlocks(links, self._budget // 16))
+        runs = writeRuns(keys, self._directory, name, self._budget, True)
+        merged = os.path.join(self._directory, name + 'Keys.bin')
+        mergeRuns(runs, merged, self._budget, True)
+        result = keysToCsr(merged, count, width, os.path.join(self._directory, name + '.bin'), self._budget)
+        os.remove(merged)
+        return result
+
+    # gets [indptr, indices] of the binary person-to-person adjacency (both
+    # directions of each pair, without the diagonal), built on first use from
+    # the pairs of members of each group
+    def _getAdjacency(self):
+        if self._adjacency is None:
+            count = len(self._persons)
+            with self._stage('pairs') as record:
+                pairs = os.path.join(self._directory, 'pairs.bin')
+                chunks = groupPairs(self._groupPtr, self._groupIdx, count, self._budget // 16)
+                record['counts']['pairs'] = mergeRuns(writeRuns(chunks, self._directory, 'pairs', self._budget, True), pairs, self._budget, True)
+
+            # the pairs are first < second, so the reversed pairs are merged
+            # in to get every row of the adjacency
+            with self._stage('adjacency') as record:
+                reverse = (block % count * count + block // count for block in readBlocks(pairs, self._budget // 16))
+                runs = [pairs] + writeRuns(reverse, self._directory, 'reverse', self._budget)
+                merged = os.path.join(self._directory, 'adjacencyKeys.bin')
+                record['counts']['nonzeros'] = mergeRuns(runs, merged, self._budget)
+                self._adjacency = keysToCsr(merged, count, count, os.path.join(self._directory, 'adjacency.bin'), self._budget)
+                os.remove(merged)
+        return self._adjacency
+
+    # gets the component label of every person (the first len(persons)
+    # labels) and every group (the rest), in the order of the first person
+    # or group of each component, as for Network
+    def _getComponents(self):
+        if self._labels is None:
+            with self._stage('components', links=len(self._personIdx)):
+                self._labels = linkComponents(self._personPtr, self._personIdx, len(self._groups), self._budget // 16)
+        return self._labels
+
+    # gets the arrays searched by the engine (see paths)
+    def _getSearchArrays(self):
+        if self._engine == 'bipartite':
+            return (self._personPtr, self._personIdx, self._groupPtr, self._groupIdx)
+        return tuple(self._getAdjacency())
+
+    # counts the number of edges (links) between persons (binary)
+    def getUniqueEdges(self):
+        return len(self._getAdjacency()[1]) // 2
+
+    # gets the network density (binary), over the persons with at least one
+    # co-enrollment, as for Network
+    def getNetworkDensity(self):
+        n = int(np.count_nonzero(np.diff(self._getAdjacency()[0])))
+        return 2 * self.getUniqueEdges() / (n * (n - 1)) if n > 1 else 0
+
+    # counts all the coenrollments and averages them over all persons, a
+    # group of size s adds s(s - 1) coenrollments
+    def getMeanCoEnrollments(self):
+        sizes = np.diff(self._groupPtr)
+        return int(np.dot(sizes, sizes - 1)) / len(self._persons)
+
+    # counts all the unique coenrollments (neighbors) and averages them over
+    # all persons with at least one coenrollment
+    def getMeanUniqueCoEnrollments(self):
+        degrees = np.diff(self._getAdjacency()[0])
+        return int(degrees.sum()) / int(np.count_nonzero(degrees))
+
+    # returns a list containing the proportion of persons in largest component
+    # and proportion of groups in largest component as [p, g]
+    def getLargestProportion(self):
+        labels = self._getComponents()
+        largest = int(np.argmax(np.bincount(labels)))
+        countP = int(np.count_nonzero(labels[:len(self._persons)] == largest))
+        countG = int(np.count_nonzero(labels[len(self._persons):] == largest))
+        return [countP / len(self._persons), countG / len(self._groups)]
+
+    # gets the characteristic path length, the average distance between
+    # persons (binary), -1.0 if they are not all connected
+    def getCharPathLength(self):
+        return self._getData(0)['path']
+
+    # gets the network diameter (binary), -1 if the persons are not all
+    # connected
+    def getNetworkDiameter(self):
+        return self._getData(0)['diameter']
+
+    # get the k-step reach of the proportion of person pairs that can be
+    # linked in k steps,
+    # if multiple is true, returns reach for 0, 1, 2, 3, ... k as a list
+    def getKStepReach(self, k, multiple=False):
+        result = self._getData(k)['reach']
+        return result if multiple else result[k]
+
+    # estimates the characteristic path length from searches from samples
+    # random persons (or until the confidence interval is within tolerance),
+    # as a dictionary with keywords 'path', 'low', 'high' and 'samples' (see
+    # Network.getApproxCharPathLength)
+    def getApproxCharPathLength(self, samples=100, tolerance=None, confidence=0.95, seed=None):
+        means, reaches, connected = self._getSample(0, samples, tolerance, confidence, seed)
+        if not connected:
+            return {'path': -1.0, 'low': -1.0, 'high': -1.0, 'samples': len(means)}
+        estimate = paths.estimateMean(means, len(self._persons), confidence)
+        return {'path': estimate[0], 'low': estimate[1], 'high': estimate[2], 'samples': len(means)}
+
+    # estimates the k-step reach from searches from samples random persons
+    # (or until the confidence interval is within tolerance), as a dictionary
+    # with keywords 'reach', 'low', 'high' and 'samples' (see
+    # Network.getApproxKStepReach)
+    def getApproxKStepReach(self, k, multiple=False, samples=100, tolerance=None, confidence=0.95, seed=None):
+        means, reaches, connected = self._getSample(k, samples, tolerance, confidence, seed)
+        estimates = [paths.estimateMean(reaches[:, x], len(self._persons), confidence) for x in range(k+1)]
+        result = {'samples': len(means)}
+        for i, key in enumerate(['reach', 'low', 'high']):
+            values = [estimate[i] for estimate in estimates]
+            result[key] = values if multiple else values[k]
+        return result
+
+    # gets lower and upper bounds on the network diameter from double-sweep
+    # searches (see Network.getApproxNetworkDiameter)
+    def getApproxNetworkDiameter(self, sweeps=4, seed=None):
+        rng = np.random.default_rng(seed)
+        starts = rng.choice(len(self._persons), size=min(sweeps, len(self._persons)), replace=False)
+        lower, upper, searches = paths.diameterBounds(self._getSearchArrays(), starts)
+        return {'lower': lower, 'upper': upper, 'searches': searches}
+
+    def _getSample(self, k, samples, tolerance, confidence, seed):
+        order = np.random.default_rng(seed).permutation(len(self._persons))
+        with self._stage('sample') as record:
+            result = paths.sampleStats(self._getSearchArrays(), order, k, samples, tolerance, confidence)
+            record['counts']['sources'] = len(result[0])
+        return result
+
+    # gets the path metrics from the distance histogram of searches from
+    # every person (see paths.histogramData), found once
+    def _getData(self, k):
+        if self._histogram is None:
+            sources = np.arange(len(self._persons))
+            with self._stage('histogram', sources=len(sources)):
+                self._histogram = paths.parallelDistanceHistogram(self._getSearchArrays(), sources, self._workers, self._directory)
+        return paths.histogramData(self._histogram, len(self._persons), k)
+
+# returns the keys person * groups + group (or group * persons + person, if
+# byGroup is true) of a block of links person << 32 | group, renumbered by
+# personMap and groupMap
+def _linkKeys(block, personMap, groupMap, byGroup):
+    persons = personMap[block >> 32].astype(np.int64)
+    groups = groupMap[block & 0xFFFFFFFF].astype(np.int64)
+    if byGroup:
+        return groups * max(len(personMap), 1) + persons
+    return persons * max(len(groupMap), 1) + groups
+
+# sorts each chunk of int64 keys (an iterable of arrays, each at most half of
+# budget bytes) and writes it to a file name0.bin, name1.bin, ... in
+# directory, returns the list of files (the runs); if unique is true,
+# repeated keys are dropped from each run
+# chunks are gathered up to half of budget bytes before being sorted
+def writeRuns(chunks, directory, name, budget, unique=False):
+    runs = []
+    held = []
+    size = 0
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is not None:
+            held.append(chunk)
+            size = size + chunk.nbytes
+        if len(held) > 0 and (chunk is None or size >= budget // 2):
+            keys = np.concatenate(held)
+            keys = sortKeys(keys, unique)
+            runs.append(os.path.join(directory, '%s%d.bin' % (name, len(runs))))
+            keys.tofile(runs[-1])
+            held = []
+            size = 0
+    return runs
+
+# merges the sorted runs of int64 keys (files written by writeRuns) into the
+# file path, reading a block of each run at a time so that about budget
+# bytes are held, and removes the runs; returns the number
+# of keys written (repeated keys are written once if unique is true)
+# each round writes the keys up to the smallest last key of the blocks of
+# the runs that have more to read, since every key still to be read is at
+# least that large
+def mergeRuns(runs, path, budget, unique=False):
+    block = max(1, budget // (16 * (len(runs) + 1)))
+    sizes = [os.path.getsize(run) // 8 for run in runs]
+    read = [0] * len(runs)
+    held = [np.zeros(0, dtype=np.int64)] * len(runs)
+    written = 0
+    last = None
+    with open(path + '.part', 'wb') as output:
+        while True:
+            for i, run in enumerate(runs):
+                if len(held[i]) == 0 and read[i] < sizes[i]:
+                    held[i] = np.fromfile(run, dtype=np.int64, count=block, offset=read[i] * 8)
+                    read[i] = read[i] + len(held[i])
+            if all(len(keys) == 0 for keys in held):
+                break
+
+            more = [held[i][-1] for i in range(len(runs)) if read[i] < sizes[i]]
+            bound = min(more) if len(more) > 0 else None
+            taken = []
+            for i in range(len(runs)):
+                end = len(held[i]) if bound is None else np.searchsorted(held[i], bound, side='right')
+                taken.append(held[i][:end])
+                held[i] = held[i][end:]
+            keys = sortKeys(np.concatenate(taken), unique)
+            if unique and last is not None and len(keys) > 0 and keys[0] == last:
+                keys = keys[1:]
+            if len(keys) > 0:
+                keys.tofile(output)
+                written = written + len(keys)
+                last = keys[-1]
+    for run in runs:
+        os.remove(run)
+    os.replace(path + '.part', path)
+    return written
+
+# returns the keys sorted, without repeats if unique is true (a sort and a
+# comparison of neighbors, which is faster than np.unique for int64 keys)
+def sortKeys(keys, unique):
+    keys = np.sort(keys)
+    if unique and len(keys) > 1:
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return keys
+
+# returns the blocks of int64 keys in a file, items keys at a time
+def readBlocks(path, items):
+    size = os.path.getsize(path) // 8
+    for start in range(0, size, max(1, items)):
+        yield np.fromfile(path, dtype=np.int64, count=items, offset=start * 8)
+
+# returns [indptr, indices] of the CSR matrix with count rows of the sorted
+# keys (row * width + column) in the file keys, writing the column indices
+# to the file path (as int32) and memory-mapping them
+def keysToCsr(keys, count, width, path, budget):
+    lengths = np.zeros(count, dtype=np.int64)
+    with open(path, 'wb') as output:
+        for block in readBlocks(keys, budget // 16):
+            lengths += np.bincount(block // max(width, 1), minlength=count)
+            (block % max(width, 1)).astype(np.int32).tofile(output)
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    return [indptr, openArray(path, np.int32)]
+
+# memory-maps the array of the given type in the file path read-only
+def openArray(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+# returns the pairs of members of each group (with CSR members groupPtr,
+# members), as chunks of keys first * count + second with first < second
+# (the members of each group are sorted), of about items keys each
+# each member of a group is paired with the members after it, so a chunk
+# ends between members (a member of a very large group can go over items)
+def groupPairs(groupPtr, members, count, items):
+    positions = max(1, items // 16)
+    for start in range(0, len(members), positions):
+        stop = min(start + positions, len(members))
+        position = np.arange(start, stop)
+        ends = groupPtr[np.searchsorted(groupPtr, position, side='right')]
+        partners = ends - position - 1
+        bounds = np.concatenate(([0], np.cumsum(partners)))
+
+        # split the positions into runs of about items pairs
+        cuts = np.searchsorted(bounds, np.arange(0, bounds[-1], max(1, items)), side='right') - 1
+        cuts = np.unique(np.concatenate(([0], cuts, [len(position)])))
+        for first, last in zip(cuts[:-1], cuts[1:]):
+            lengths = partners[first:last]
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            owners = np.repeat(position[first:last], lengths)
+            offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            low = np.asarray(members[owners], dtype=np.int64)
+            high = np.asarray(members[owners + 1 + offsets], dtype=np.int64)
+            yield low * count + high
+
+# returns the component label of every person and group (persons first) of
+# the links with CSR incidence (personPtr, groups), labeled in the order of
+# the first person or group of each component, reading items links at a time
+# the labels after each block join the components of the links in it, with
+# the components of the labels found by scipy
+def linkComponents(personPtr, groups, numGroups, items):
+    numPersons = len(personPtr) - 1
+    count = numPersons + numGroups
+    labels = np.arange(count)
+    for start in range(0, len(groups), max(1, items)):
+        position = np.arange(start, min(start + items, len(groups)))
+        first = labels[np.searchsorted(personPtr, position, side='right') - 1]
+        second = labels[numPersons + np.asarray(groups[position], dtype=np.int64)]
+        graph = sparse.coo_matrix((np.ones(len(first), dtype=np.int32), (first, second)), shape=(count, count))
+        labels = csgraph.connected_components(graph, directed=False)[1][labels]
+
+    # renumber in the order of the first node of each component
+    values, firstNodes, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.empty(len(values), dtype=np.int32)
+    order[np.argsort(firstNodes)] = np.arange(len(values), dtype=np.int32)
+    return order[inverse]
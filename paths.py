@@ -0,0 +1,373 @@
+# Breadth-first search over the index arrays of sparse (CSR) matrices, used by
+# Network for the path metrics (characteristic path length, network diameter,
+# and k-step reach).
+
+# A CSR matrix is passed as its indptr and indices arrays, so the row i
+# neighbors are indices[indptr[i]:indptr[i+1]]. Persons and groups are
+# referred to by their row in the person-to-group incidence matrix (persons)
+# or in its transpose (groups). Distances are returned as arrays with -1 for
+# persons that cannot be reached.
+
+# The searches are described by a tuple of arrays: (indptr, indices) of the
+# person-to-person adjacency, or (personPtr, personIdx, groupPtr, groupIdx) of
+# the person-to-group incidence and its transpose.
+
+import mmap
+import multiprocessing
+import os
+import tempfile
+from statistics import NormalDist
+
+import numpy as np
+
+# returns the neighbors of all the given rows of a CSR matrix as one array
+# (with repeats), gathered without a Python loop over the rows
+def gatherNeighbors(indptr, indices, rows):
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return indices[:0]
+
+    # position of every neighbor in indices: the start of its row plus its
+    # offset within the row
+    shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return indices[shift + np.arange(total)]
+
+# returns the distance from the source person to every person, searching the
+# person-to-person adjacency (indptr, indices) level by level
+def projectionDistances(indptr, indices, source):
+    dist = np.full(len(indptr) - 1, -1, dtype=np.int32)
+    dist[source] = 0
+
+    frontier = np.array([source], dtype=indices.dtype)
+    level = 0
+    while len(frontier) > 0:
+        level = level + 1
+        persons = gatherNeighbors(indptr, indices, frontier)
+        persons = np.unique(persons[dist[persons] < 0])
+        dist[persons] = level
+        frontier = persons
+    return dist
+
+# returns the distance from the source person to every person, searching the
+# person-to-group links (personPtr, personIdx) and group-to-person links
+# (groupPtr, groupIdx) directly: one step goes from the frontier persons to
+# their groups and from those groups to their persons, and each group is
+# visited at most once per search
+def bipartiteDistances(personPtr, personIdx, groupPtr, groupIdx, source):
+    dist = np.full(len(personPtr) - 1, -1, dtype=np.int32)
+    dist[source] = 0
+    visited = np.zeros(len(groupPtr) - 1, dtype=bool)
+
+    frontier = np.array([source], dtype=personIdx.dtype)
+    level = 0
+    while len(frontier) > 0:
+        level = level + 1
+        groups = gatherNeighbors(personPtr, personIdx, frontier)
+        groups = np.unique(groups[~visited[groups]])
+        visited[groups] = True
+
+        persons = gatherNeighbors(groupPtr, groupIdx, groups)
+        persons = np.unique(persons[dist[persons] < 0])
+        dist[persons] = level
+        frontier = persons
+    return dist
+
+# returns [personLevels, groupLevels] of a search from the source person
+# over the person-to-group links, for at most k steps: personLevels[d] are
+# the persons first reached in d steps (personLevels[0] is the source) and
+# groupLevels[d] the groups first reached from personLevels[d]
+# levels, if given, is the result of an earlier search from the same source
+# for fewer steps, which is carried on from where it stopped; the search
+# stops early once target (a person) is reached, or when it runs out of
+# persons to reach, ending the person levels with an empty one
+def bipartiteLevels(personPtr, personIdx, groupPtr, groupIdx, source, k, levels=None, target=None):
+    if levels is None:
+        personLevels = [np.array([source], dtype=personIdx.dtype)]
+        groupLevels = []
+    else:
+        personLevels = list(levels[0])
+        groupLevels = list(levels[1])
+
+    seen = np.zeros(len(personPtr) - 1, dtype=bool)
+    visited = np.zeros(len(groupPtr) - 1, dtype=bool)
+    seen[np.concatenate(personLevels)] = True
+    if len(groupLevels) > 0:
+        visited[np.concatenate(groupLevels)] = True
+
+    while len(personLevels) - 1 < k and len(personLevels[-1]) > 0:
+        if target is not None and seen[target]:
+            break
+        groups = gatherNeighbors(personPtr, personIdx, personLevels[-1])
+        groups = np.unique(groups[~visited[groups]])
+        visited[groups] = True
+        
+        persons = gatherNeighbors(groupPtr, groupIdx, groups)
+        persons = np.unique(persons[~seen[persons]])
+        seen[persons] = True
+        groupLevels.append(groups)
+        personLevels.append(persons)
+    return [personLevels, groupLevels]
+
+# returns a shortest path to the target person, found in the levels of a
+# search (see bipartiteLevels) that reached it in d steps, as [persons, 
+# groups]: the d + 1 persons on the path from the source to the target and
+# the d groups linking each of them to the next
+# each step back picks the first group of the person reached one level
+# earlier, and the first person of that group reached one level before that
+def levelPath(personPtr, personIdx, groupPtr, groupIdx, levels, target, d):
+    personLevels, groupLevels = levels
+    persons = [int(target)]
+    groups = []
+    for level in range(d - 1, -1, -1):
+        linked = personIdx[personPtr[persons[-1]]:personPtr[persons[-1] + 1]]
+        group = linked[np.isin(linked, groupLevels[level])][0]
+        members = groupIdx[groupPtr[group]:groupPtr[group + 1]]
+        groups.append(int(group))
+        persons.append(int(members[np.isin(members, personLevels[level])][0]))
+    return [persons[::-1], groups[::-1]]
+
+# returns the distance from the source person to every person using the
+# search described by arrays (see above)
+def distances(arrays, source):
+    if len(arrays) == 2:
+        return projectionDistances(arrays[0], arrays[1], source)
+    return bipartiteDistances(arrays[0], arrays[1], arrays[2], arrays[3], source)
+
+# returns the distance histogram for the given source persons as
+# [counts, unreachable]: counts[d] is the number of (source, person) pairs at
+# distance d (counts[0] is always 0, a source is not paired with itself) and
+# unreachable is the number of pairs that are not connected
+# each search is reduced to its histogram right away, so memory does not grow
+# with the number of sources
+def distanceHistogram(arrays, sources):
+    counts = np.zeros(1, dtype=np.int64)
+    unreachable = 0
+    for source in sources:
+        dist = distances(arrays, source)
+        reached = dist[dist >= 0]
+        unreachable = unreachable + len(dist) - len(reached)
+
+        hist = np.bincount(reached)
+        if len(hist) > len(counts):
+            counts = np.concatenate((counts, np.zeros(len(hist) - len(counts), dtype=np.int64)))
+        counts[:len(hist)] += hist
+    counts[0] = 0
+    return [counts, unreachable]
+
+# adds up histograms [counts, unreachable] in the order given
+def mergeHistograms(histograms):
+    size = max(len(counts) for counts, unreachable in histograms)
+    counts = np.zeros(size, dtype=np.int64)
+    unreachable = 0
+    for part, missing in histograms:
+        counts[:len(part)] += part
+        unreachable = unreachable + missing
+    return [counts, unreachable]
+
+# same as distanceHistogram, but the sources are split into chunks that are
+# searched by a pool of worker processes, each returning the histogram of its
+# chunk; the chunk histograms are merged in order, so the result is the same
+# as the serial one (directory is as for mapChunks)
+def parallelDistanceHistogram(arrays, sources, workers, directory=None):
+    sources = np.asarray(sources)
+    if workers <= 1 or len(sources) < 2:
+        return distanceHistogram(arrays, sources)
+    return mergeHistograms(mapChunks(distanceHistogram, arrays, sources, workers, directory))
+
+# returns [function(arrays, chunk) for each chunk of the sources], where the
+# chunks are run by a pool of worker processes (function needs to be defined
+# at the top level of a module)
+# every worker opens the arrays read-only through memory maps, instead of
+# them being pickled with each chunk: arrays that are already memory-mapped
+# files are opened where they are, and the rest are written once to files
+# in a temporary directory (in directory, if given)
+def mapChunks(function, arrays, sources, workers, directory=None):
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        files = []
+        for i, array in enumerate(arrays):
+            if _isMappedFile(array):
+                files.append([array.filename, array.dtype.str, array.offset, array.shape])
+            else:
+                name = os.path.join(temporary, 'array%d.npy' % (i))
+                np.save(name, array)
+                files.append([name])
+        
+        # a few chunks per worker to even out slow sources
+        chunks = np.array_split(sources, min(len(sources), workers * 4))
+        with multiprocessing.Pool(workers, initializer=_openArrays, initargs=(files, function)) as pool:
+            return pool.map(_runChunk, chunks)
+
+# arrays opened by a worker process of mapChunks, and the function it runs
+_workerArrays = None
+_workerFunction = None
+
+def _openArrays(files, function):
+    global _workerArrays, _workerFunction
+    _workerArrays = tuple(np.load(file[0], mmap_mode='r') if len(file) == 1 else
+                          np.memmap(file[0], dtype=file[1], mode='r', offset=file[2], shape=file[3]) for file in files)
+    _workerFunction = function
+
+# whether an array is the whole of a memory-mapped file (or the part of it
+# from its offset), rather than in memory or a slice of a memory map
+def _isMappedFile(array):
+    return isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.filename is not None
+
+def _runChunk(sources):
+    return _workerFunction(_workerArrays, sources)
+
+# returns the characteristic path length, diameter and k-step reach of
+# persons persons from their distance histogram [counts, unreachable] (see
+# distanceHistogram) as a dictionary with keywords 'path', 'diameter' and
+# 'reach' (a list for 0, 1, 2, ... k steps)
+# if the persons are not all connected, 'path' is -1.0 and 'diameter' is -1
+def histogramData(histogram, persons, k):
+    counts, unreachable = histogram
+
+    # the histogram counts each pair of persons in both directions
+    numPairs = persons * (persons - 1) // 2
+    reached = np.cumsum(counts) // 2
+
+    result = {}         # result dictionary
+
+    # pairs within x steps for x = 0, 1, ... k
+    count = [int(reached[min(x, len(reached) - 1)]) for x in range(k+1)]
+    for i in range(len(count)):
+        count[i] = count[i] / numPairs
+    result['reach'] = count
+
+    if unreachable == 0:
+        totalLen = int(np.dot(np.arange(len(counts)), counts)) // 2
+        result['path'] = totalLen / numPairs
+        result['diameter'] = int(np.flatnonzero(counts).max(initial=0))
+    else:
+        result['path'] = -1.0
+        result['diameter'] = -1
+
+    return result
+
+# returns the per-source statistics of searches from the given sources as
+# [means, reaches, connected]: means[i] is the mean distance from source i to
+# the other persons, reaches[i][x] the proportion of the other persons within
+# x steps for x = 0, 1, ... k, and connected is False if any search did not
+# reach every person
+def sourceStats(arrays, sources, k):
+    means = []
+    reaches = []
+    connected = True
+    for source in sources:
+        dist = distances(arrays, source)
+        others = len(dist) - 1
+        reached = dist[dist > 0]
+        if len(reached) < others:
+            connected = False
+
+        means.append(reached.sum() / others)
+        within = np.cumsum(np.bincount(reached, minlength=k+1))[:k+1]
+        reaches.append(within / others)
+    return [np.array(means), np.array(reaches).reshape(len(means), k+1), connected]
+
+# estimates the mean of a population of the given size from a simple random
+# sample of its values, returns [estimate, low, high] where low and high are
+# the bounds of the normal confidence interval (with finite population
+# correction, so the interval is a point once every value is sampled)
+def estimateMean(values, population, confidence):
+    values = np.asarray(values, dtype=float)
+    estimate = float(values.mean())
+    if len(values) < 2:
+        return [estimate, float('-inf'), float('inf')]
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    correction = (population - len(values)) / (population - 1)
+    error = z * np.sqrt(values.var(ddof=1) / len(values) * correction)
+    return [estimate, estimate - error, estimate + error]
+
+# returns the per-source statistics (see sourceStats) of searches from the
+# persons in order (a random permutation of every person), either the first
+# samples of them or, if tolerance is given, as many as needed for the
+# confidence interval of the mean distance (or of the k-step reach for k > 0)
+# to be within tolerance, searched in batches
+def sampleStats(arrays, order, k, samples, tolerance, confidence):
+    if tolerance is None:
+        return sourceStats(arrays, order[:samples], k)
+
+    batch = 32
+    means, reaches, connected = sourceStats(arrays, order[:batch], k)
+    while len(means) < len(order):
+        # a disconnected graph has no path length to estimate
+        if k == 0 and not connected:
+            break
+
+        values = means if k == 0 else reaches[:, k]
+        estimate = estimateMean(values, len(order), confidence)
+        if (estimate[2] - estimate[1]) / 2 <= tolerance:
+            break
+
+        more = sourceStats(arrays, order[len(means):len(means) + batch], k)
+        means = np.concatenate((means, more[0]))
+        reaches = np.concatenate((reaches, more[1]))
+        connected = connected and more[2]
+    return [means, reaches, connected]
+
+# returns [lower, upper, searches]: bounds on the diameter from double sweeps
+# (a search from a random start, then a search from the farthest person found,
+# whose eccentricity is a lower bound), where the upper bound is twice the
+# smallest eccentricity found, and searches is the number of searches run
+# lower and upper are -1 if the persons are not all connected
+def diameterBounds(arrays, starts):
+    lower = 0
+    upper = None
+    searches = 0
+    for start in starts:
+        for sweep in range(2):
+            dist = distances(arrays, start)
+            searches = searches + 1
+            if (dist < 0).any():
+                return [-1, -1, searches]
+
+            eccentricity = int(dist.max())
+            lower = max(lower, eccentricity)
+            upper = 2 * eccentricity if upper is None else min(upper, 2 * eccentricity)
+            start = int(np.argmax(dist))
+    return [lower, upper, searches]
+
+# returns [diameter, searches]: the exact diameter found with the bounding
+# diameters algorithm (Takes and Kosters), and the number of searches it ran
+# every search from a person v with eccentricity e bounds the eccentricity of
+# each person w at distance d from v to between max(d, e - d) and e + d, and
+# the diameter is at least the largest lower bound; persons whose upper bound
+# is no more than that cannot raise it and are dropped, and the next search
+# alternates between the person with the largest upper bound and the one with
+# the smallest lower bound
+# the diameter is -1 if the persons are not all connected
+def boundedDiameter(arrays):
+    count = len(arrays[0]) - 1
+    lower = np.zeros(count, dtype=np.int64)
+    upper = np.full(count, np.iinfo(np.int64).max // 4, dtype=np.int64)
+    candidates = np.ones(count, dtype=bool)
+    
+    diameter = 0
+    searches = 0
+    high = True
+    while candidates.any():
+        remaining = np.flatnonzero(candidates)
+        if high:
+            source = remaining[np.argmax(upper[remaining])]
+        else:
+            source = remaining[np.argmin(lower[remaining])]
+        high = not high
+        
+        dist = distances(arrays, source).astype(np.int64)
+        searches = searches + 1
+        if (dist < 0).any():
+            return [-1, searches]
+        
+        eccentricity = int(dist.max())
+        lower = np.maximum(lower, np.maximum(dist, eccentricity - dist))
+        upper = np.minimum(upper, eccentricity + dist)
+        diameter = max(diameter, int(lower.max()))
+        
+        candidates[source] = False
+        candidates &= upper > diameter
+    return [diameter, searches]
@@ -0,0 +1,105 @@
+# Timing and memory records of the stages of Network (reading links,
+# building the incidence and person-to-person matrices, the binary network,
+# components, searches, clustering, betweenness, ...), for finding where a
+# slow Network spends its time.
+
+# A Profiler is passed to a Network (Network(edges, profiler=Profiler())),
+# which records a stage each time it does one of these steps. Each stage
+# records its wall and CPU seconds, the counts of what it worked on (links,
+# pairs, search sources, ...), and, if memory is true, the peak memory
+# allocated during it (found with tracemalloc, which slows Python down).
+# Stages can be nested (for example, the person-to-person matrix is built
+# while building the binary network), and the times of a stage include its
+# nested stages. If a callback is given, it is called with each stage record
+# as it ends, for sending the records on to other tools.
+
+from contextlib import contextmanager
+import time
+import tracemalloc
+
+class Profiler:
+    def __init__(self, callback=None, memory=False):
+        self._callback = callback
+        self._memory = memory
+        self._records = []
+
+        # [start current, peak before nested stages] of the open stages
+        self._open = []
+
+        self._started = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    # records the stage run inside the with block, yields the record so the
+    # counts (record['counts']) can be added to inside it
+    @contextmanager
+    def stage(self, name, **counts):
+        record = {'stage': name, 'depth': len(self._open), 'counts': dict(counts)}
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if len(self._open) > 0:
+                self._open[-1][1] = max(self._open[-1][1], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        self._open.append([current, 0])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            start, before = self._open.pop()
+            if self._memory:
+                peak = max(tracemalloc.get_traced_memory()[1], before)
+                record['peakBytes'] = peak - start
+                if len(self._open) > 0:
+                    self._open[-1][1] = max(self._open[-1][1], peak)
+            else:
+                record['peakBytes'] = None
+            self._records.append(record)
+            if self._callback is not None:
+                self._callback(record)
+
+    # returns the list of stage records in the order they ended, each a
+    # dictionary with keywords 'stage', 'depth' (the number of stages it was
+    # nested in), 'wall', 'cpu', 'peakBytes' (None without memory) and
+    # 'counts' (a dictionary)
+    def getRecords(self):
+        return [dict(record, counts=dict(record['counts'])) for record in self._records]
+
+    # returns a dictionary of stage name to the totals of its records, each a
+    # dictionary with keywords 'calls', 'wall', 'cpu', 'peakBytes' (the
+    # largest) and 'counts' (summed)
+    def getReport(self):
+        report = {}
+        for record in self._records:
+            total = report.setdefault(record['stage'], {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peakBytes': None, 'counts': {}})
+            total['calls'] = total['calls'] + 1
+            total['wall'] = total['wall'] + record['wall']
+            total['cpu'] = total['cpu'] + record['cpu']
+            if record['peakBytes'] is not None:
+                total['peakBytes'] = max(total['peakBytes'] or 0, record['peakBytes'])
+            for name, count in record['counts'].items():
+                total['counts'][name] = total['counts'].get(name, 0) + count
+        return report
+
+    # prints the report, one line a stage
+    def printReport(self):
+        print("%-24s %6s %10s %10s %12s  %s" % ("Stage", "Calls", "Wall (s)", "CPU (s)", "Peak bytes", "Counts"))
+        for name, total in self.getReport().items():
+            peak = "%12d" % (total['peakBytes']) if total['peakBytes'] is not None else "%12s" % ("-")
+            counts = ", ".join("%s=%d" % (key, value) for key, value in total['counts'].items())
+            print("%-24s %6d %10.4f %10.4f %s  %s" % (name, total['calls'], total['wall'], total['cpu'], peak, counts))
+
+    # clears the records
+    def clear(self):
+        self._records = []
+
+    # stops tracing memory allocations if this Profiler started it
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
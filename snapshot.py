@@ -0,0 +1,98 @@
+# Binary snapshots of Networks, so a Network built once can be reopened
+# without reading its source files again.
+
+# A snapshot file is the magic bytes, the length of a JSON header (8 bytes,
+# little-endian), the header, and then the arrays, each starting on a 64 byte
+# boundary. The header gives the engine, the content hash of the source files
+# (see loader.sourceHash), the fingerprint of the links (see fingerprint), and
+# the dtype, shape and offset of every array.
+# Names are stored as one UTF-8 byte array per table plus the offset of each
+# name in it. Arrays can be memory-mapped read-only when the snapshot is
+# opened, so opening is fast and processes opening the same snapshot share
+# its pages.
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+MAGIC = b'SWNSNAP1'
+ALIGN = 64
+
+# writes the arrays (a dictionary of name to array) and the header
+# (a dictionary that can be written as JSON) to a snapshot file
+# the snapshot is written to a new file that then replaces path, so arrays
+# memory-mapped from an earlier snapshot at path stay valid while writing
+def writeSnapshot(path, header, arrays):
+    header = dict(header)
+    header['arrays'] = {}
+
+    # offsets are from the start of the arrays, which follow the header
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    text = json.dumps(header).encode('utf-8')
+    start = _aligned(len(MAGIC) + 8 + len(text))
+
+    handle, part = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(MAGIC)
+            file.write(len(text).to_bytes(8, 'little'))
+            file.write(text)
+            for name, array in arrays.items():
+                file.seek(start + header['arrays'][name]['offset'])
+                file.write(np.ascontiguousarray(array).tobytes())
+        # the permissions open would have given a new file
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(part, 0o666 & ~umask)
+        os.replace(part, path)
+    except BaseException:
+        os.remove(part)
+        raise
+
+# reads a snapshot file, returns [header, arrays], where the arrays are
+# read-only memory maps of the file if memoryMap is true
+def readSnapshot(path, memoryMap=True):
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise Exception("Not a Network snapshot: " + path)
+        size = int.from_bytes(file.read(8), 'little')
+        header = json.loads(file.read(size).decode('utf-8'))
+    start = _aligned(len(MAGIC) + 8 + size)
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        elif memoryMap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=start + spec['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=count, offset=start + spec['offset']).reshape(shape)
+    return [header, arrays]
+
+# returns [data, offsets]: the names as one UTF-8 byte array, and the start
+# of each name in it (with the end of the last one at the end)
+def encodeNames(names):
+    if not all(isinstance(name, str) for name in names):
+        raise Exception("Snapshots need person and group names that are strings.")
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+    return [np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets]
+
+# returns the list of names stored by encodeNames
+def decodeNames(data, offsets):
+    data = bytes(data)
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i+1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
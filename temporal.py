@@ -0,0 +1,249 @@
+# Temporal analysis of a sequence of terms (for example, semesters), each a
+# person-to-group network, for comparing the terms with each other and
+# following the network as it grows from term to term.
+
+# The terms are loaded once (see loader.loadTerms): the persons and groups of
+# every term share one set of IDs, and the links of each term are a slice of
+# the same link arrays. The Network of a term, or the cumulative Network of
+# every link seen up to a term, is made from its slice without reading or
+# interning any names again. The metrics of the terms are found by worker
+# processes that share the link arrays through memory-mapped files (see
+# paths.mapChunks), and the changes from term to term (persons, groups and
+# person-to-person edges added and removed, and the change in each metric)
+# are found by comparing the shared IDs.
+
+# Example:
+#   terms = TemporalNetwork(['fall.csv', 'spring.csv', 'summer.csv'], workers=4)
+#   for change in terms.getTermChanges():
+#       print(change['term'], change['edgesAdded'], change['componentsChange'])
+
+from contextlib import nullcontext
+import os
+
+import numpy as np
+from scipy import sparse
+
+import loader
+import paths
+from network import Network
+
+# metrics found for every term, in order (followed by 'reach1', 'reach2', ...)
+METRICS = ['persons', 'groups', 'links', 'uniqueEdges', 'density', 'meanCoEnrollments',
+           'meanUniqueCoEnrollments', 'components', 'proportionPersons', 'proportionGroups', 'clustering']
+
+class TemporalNetwork:
+    # creates a temporal network from a list of terms, each a file name, a
+    # list of file names, or a list of [person, group] lists (as for Network)
+    # names are the names of the terms (if None, the file name of a term with
+    # one file, otherwise 'term1', 'term2', ...); engine, workers, memoryMap
+    # and profiler are as for Network, and workers is also the number of
+    # terms analyzed at the same time
+    def __init__(self, terms, names=None, engine='projection', workers=1, memoryMap=False, profiler=None):
+        if engine not in ('projection', 'bipartite'):
+            raise Exception("Engine needs to be 'projection' or 'bipartite'.")
+        if names is not None and len(names) != len(terms):
+            raise Exception("Names needs one name for each term.")
+        self._engine = engine
+        self._workers = workers if workers is not None else os.cpu_count()
+        self._profiler = profiler
+
+        with self._stage('load', terms=len(terms)) as record:
+            persons, groups, rows, cols, offsets, stats = loader.loadTerms(terms, self._workers, memoryMap)
+            record['counts'].update(files=stats['files'], rows=stats['rows'], links=stats['links'])
+        self._persons = persons
+        self._groups = groups
+        self._linkPersons = rows
+        self._linkGroups = cols
+        self._offsets = offsets
+        self._loadStats = stats
+
+        if names is None:
+            names = [_termName(term, t) for t, term in enumerate(terms)]
+        self._names = list(names)
+        self._termIds = {name: t for t, name in enumerate(self._names)}
+
+        # whether each link is the first of its person and group in any term,
+        # so the cumulative links up to a term are the first links before
+        # the end of the term
+        keys = rows.astype(np.int64) * max(len(groups), 1) + cols
+        self._firstLinks = np.zeros(len(rows), dtype=bool)
+        self._firstLinks[np.unique(keys, return_index=True)[1]] = True
+
+        self._networks = {}
+        self._results = {}
+
+    # returns the profiler stage (see profiler.Profiler.stage), or a stand-in
+    # if there is no profiler
+    def _stage(self, name, **counts):
+        if self._profiler is None:
+            return nullcontext({'counts': {}})
+        return self._profiler.stage(name, **counts)
+
+    # return the list of the names of the terms, in order
+    def getTermNames(self):
+        return list(self._names)
+
+    # return the list of persons of all the terms
+    def getPersons(self):
+        return list(self._persons)
+
+    # return the list of groups of all the terms
+    def getGroups(self):
+        return list(self._groups)
+
+    # return the statistics of reading the links of all the terms (see
+    # loader.loadTerms) as a dictionary
+    def getLoadStats(self):
+        return dict(self._loadStats)
+
+    # returns the Network of a term (its name or position), made from the
+    # term's links and only the persons and groups in them
+    def getTerm(self, term):
+        return self._getNetwork(self._termIndex(term), False)
+
+    # returns the cumulative Network of a term (its name or position), made
+    # from the links of that term and every term before it
+    def getCumulative(self, term):
+        return self._getNetwork(self._termIndex(term), True)
+
+    def _termIndex(self, term):
+        if isinstance(term, str):
+            if term not in self._termIds:
+                raise Exception("Unknown term: " + term)
+            return self._termIds[term]
+        if term < 0 or term >= len(self._names):
+            raise Exception("Term %d is out of range." % (term))
+        return term
+
+    def _getNetwork(self, t, cumulative):
+        if (t, cumulative) not in self._networks:
+            rows, cols = termLinks(self._arrays(), t, cumulative)
+            personIds, groupIds, rows, cols = compactLinks(rows, cols)
+            persons = [self._persons[i] for i in personIds.tolist()]
+            groups = [self._groups[i] for i in groupIds.tolist()]
+            self._networks[(t, cumulative)] = Network._fromArrays(persons, groups, rows, cols, self._engine, self._workers, self._profiler)
+        return self._networks[(t, cumulative)]
+
+    def _arrays(self):
+        return (self._linkPersons, self._linkGroups, self._offsets, self._firstLinks)
+
+    # returns a list of the metrics of every term (or of the cumulative
+    # Network of every term, if cumulative is true), each a dictionary with
+    # keywords 'term' (its name), those of METRICS, and 'reach1' through
+    # 'reachk' (the k-step reach, estimated from searches from samples random
+    # persons if samples is given, see Network.getApproxKStepReach)
+    # the metrics of every term except the reach only need the term's
+    # co-enrollments and components, and the terms are split between the
+    # workers; the results are kept, so asking again is free
+    def getTermMetrics(self, cumulative=False, k=4, samples=None, seed=None):
+        return [dict(result[0]) for result in self._getResults(cumulative, k, samples, seed)]
+
+    # returns a list of the changes from each term to the next (from the
+    # second term on), each a dictionary with keywords 'term', 'previous'
+    # (the names of the two terms), 'personsAdded', 'personsRemoved',
+    # 'groupsAdded', 'groupsRemoved', 'edgesAdded', 'edgesRemoved' (pairs of
+    # persons who share a group in the term but not in the previous one, and
+    # the other way around), and the change in each metric of getTermMetrics
+    # (with the same arguments), such as 'componentsChange' and 'reach2Change'
+    def getTermChanges(self, cumulative=False, k=4, samples=None, seed=None):
+        results = self._getResults(cumulative, k, samples, seed)
+        changes = []
+        for t in range(1, len(results)):
+            before = results[t - 1]
+            after = results[t]
+            change = {'term': self._names[t], 'previous': self._names[t - 1]}
+            for i, name in [[1, 'persons'], [2, 'groups'], [3, 'edges']]:
+                change[name + 'Added'] = len(np.setdiff1d(after[i], before[i], assume_unique=True))
+                change[name + 'Removed'] = len(np.setdiff1d(before[i], after[i], assume_unique=True))
+            for name, value in after[0].items():
+                if name != 'term':
+                    change[name + 'Change'] = value - before[0][name]
+            changes.append(change)
+        return changes
+
+    # gets [metrics, persons, groups, edges] for every term (see
+    # termMetrics), found once for each set of arguments
+    def _getResults(self, cumulative, k, samples, seed):
+        key = (cumulative, k, samples, seed)
+        if key not in self._results:
+            settings = np.array([cumulative, k, samples or 0, -1 if seed is None else seed,
+                                 self._engine == 'bipartite', len(self._persons)], dtype=np.int64)
+            terms = np.arange(len(self._names))
+            with self._stage('termMetrics', terms=len(terms)):
+                results = analyzeTerms(self._arrays() + (settings,), terms, self._workers)
+            for t, result in enumerate(results):
+                result[0] = dict({'term': self._names[t]}, **result[0])
+            self._results[key] = results
+        return self._results[key]
+
+# returns the name of term t: its file name if it has one file (given as a
+# name or a list of one name), otherwise 'term' and its number from 1
+def _termName(term, t):
+    if isinstance(term, str):
+        return term
+    if len(term) == 1 and isinstance(term[0], str):
+        return term[0]
+    return 'term%d' % (t + 1)
+
+# returns [rows, cols], the person and group IDs of the links of term t, or of
+# every term up to t if cumulative is true (each link once), given arrays
+# (rows, cols, offsets, firstLinks) of the links of all the terms
+def termLinks(arrays, t, cumulative):
+    rows, cols, offsets, first = arrays[:4]
+    if not cumulative:
+        return [rows[offsets[t]:offsets[t+1]], cols[offsets[t]:offsets[t+1]]]
+    kept = first[:offsets[t+1]]
+    return [rows[:offsets[t+1]][kept], cols[:offsets[t+1]][kept]]
+
+# returns [personIds, groupIds, rows, cols]: the (sorted) IDs of the persons
+# and groups in the links, and the links renumbered by position in them
+def compactLinks(rows, cols):
+    personIds, newRows = np.unique(rows, return_inverse=True)
+    groupIds, newCols = np.unique(cols, return_inverse=True)
+    return [personIds, groupIds, newRows.astype(np.int32), newCols.astype(np.int32)]
+
+# returns [metrics, persons, groups, edges] for each of the given terms,
+# split between workers; arrays is (rows, cols, offsets, firstLinks,
+# settings), where settings is [cumulative, k, samples, seed, bipartite,
+# persons] (samples is 0 for the exact reach, and seed -1 for none)
+def analyzeTerms(arrays, terms, workers=1):
+    if workers <= 1 or len(terms) < 2:
+        return termMetrics(arrays, terms)
+    return [result for chunk in paths.mapChunks(termMetrics, arrays, terms, workers) for result in chunk]
+
+# returns [metrics, persons, groups, edges] for each of the given terms (see
+# analyzeTerms): a dictionary of METRICS and the reach, the IDs of the
+# persons and groups in the term, and the person-to-person edges as sorted
+# keys first * persons + second (in IDs, with first < second)
+def termMetrics(arrays, terms):
+    cumulative, k, samples, seed, bipartite, count = [int(value) for value in arrays[4]]
+    results = []
+    for t in terms:
+        rows, cols = termLinks(arrays, int(t), cumulative)
+        personIds, groupIds, rows, cols = compactLinks(rows, cols)
+        engine = 'bipartite' if bipartite else 'projection'
+        network = Network._fromArrays(list(range(len(personIds))), list(range(len(groupIds))), rows, cols, engine)
+
+        # edges and degrees from the projection, instead of the networkx
+        # graph Network builds for them
+        upper = sparse.triu(network._getProjection(), k=1, format='coo')
+        edges = np.sort(personIds[upper.row].astype(np.int64) * count + personIds[upper.col])
+        degrees = network.getUniqueCoEnrollments()
+        connected = int(np.count_nonzero(degrees))
+
+        metrics = {'persons': len(personIds), 'groups': len(groupIds), 'links': len(rows), 'uniqueEdges': len(edges)}
+        metrics['density'] = 2 * len(edges) / (connected * (connected - 1)) if connected > 1 else 0
+        metrics['meanCoEnrollments'] = network.getMeanCoEnrollments()
+        metrics['meanUniqueCoEnrollments'] = 2 * len(edges) / connected if connected > 0 else 0
+        metrics['components'] = int(network._getComponents().max()) + 1
+        metrics['proportionPersons'], metrics['proportionGroups'] = network.getLargestProportion()
+        metrics['clustering'] = network.getAverageClusterCoeff() if connected > 0 else 0
+
+        if samples > 0:
+            reach = network.getApproxKStepReach(k, True, samples=samples, seed=seed if seed >= 0 else None)['reach']
+        else:
+            reach = network.getKStepReach(k, True)
+        for x in range(1, k+1):
+            metrics['reach%d' % (x)] = reach[x]
+        results.append([metrics, personIds, groupIds, edges])
+    return results
@@ -4,6 +4,25 @@
 # Tester and example of use for most of the Network methods.
 
 from network import Network
+from unittest import mock
+import batchAnalysis
+import benchmark
+import clustering
+import components
+import fingerprint
+import json
+import layout
+import loader
+import networkx as nx
+import nullModel
+import numpy as np
+import os
+import outOfCore
+from outOfCore import OutOfCoreNetwork
+import paths
+from profiler import Profiler
+import tempfile
+from temporal import TemporalNetwork
 import unittest
 
 net1 = Network('test1.csv')
@@ -40,6 +59,526 @@ class NetworkTester(unittest.TestCase):
         self.assertEqual(net2.getPersonToGroupMatrix(), expected2)
         self.assertEqual(net3.getPersonToGroupMatrix(), expected3)
     
+    def testLoader(self):
+        # BOM, Windows line ends, a repeated link, an extra field, a blank line
+        text = '\ufeffB,G2\r\nA,G1\r\nB,G2\r\nC,G1,extra\r\n\r\nA,G2'
+        expected = Network([['B','G2'],['A','G1'],['C','G1'],['A','G2']])
+
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'links.csv')
+            with open(name, 'w', encoding='utf-8', newline='') as file:
+                file.write(text)
+
+            self.assertEqual(Network(name), expected)
+            self.assertEqual(Network(name, memoryMap=True), expected)
+            self.assertEqual(Network(name).getLoadStats()['rows'], 5)
+            self.assertEqual(Network(name).getLoadStats()['links'], 4)
+
+            # chunks that end in the middle of lines
+            for chunkSize in [1, 5, 7]:
+                actual = loader.loadLinks(name, chunkSize=chunkSize)
+                self.assertEqual(actual[0], ['A','B','C'])
+                self.assertEqual(actual[1], ['G1','G2'])
+                self.assertEqual(actual[2].tolist(), [1, 0, 2, 0])
+                self.assertEqual(actual[3].tolist(), [1, 0, 0, 1])
+
+            # a line without a comma is rejected, naming the file and line,
+            # whatever chunk it is in
+            with open(name, 'w', encoding='utf-8', newline='') as file:
+                file.write('A,G1\r\n\r\nB G2\r\nC,G1\r\n')
+            for chunkSize in [1, 5, loader.CHUNK_SIZE]:
+                with self.assertRaisesRegex(Exception, 'Line 3 of .*links.csv has no comma'):
+                    loader.loadLinks(name, chunkSize=chunkSize)
+            with self.assertRaisesRegex(Exception, 'Line 3 of'):
+                OutOfCoreNetwork(name, directory=os.path.join(directory, 'work'))
+            self.assertEqual(os.listdir(os.path.join(directory, 'work')), [])
+            with mock.patch.object(outOfCore.tempfile, 'mkdtemp', return_value=os.path.join(directory, 'temporary')):
+                self.assertRaises(Exception, OutOfCoreNetwork, name)
+            self.assertFalse(os.path.exists(os.path.join(directory, 'temporary')))
+
+        # files read at the same time
+        files = ['test1.csv', 'test2.csv', 'test3.csv']
+        self.assertEqual(Network(files, workers=3), Network(files))
+        self.assertEqual(Network(files, workers=3).getLoadStats()['files'], 3)
+        self.assertIsNone(net1.largestComponentToNetwork().getLoadStats())
+
+    def testCache(self):
+        net4 = Network('test2.csv', engine='bipartite')
+        self.assertEqual(net4.getCacheInfo(), {})
+
+        # the projection is shared by the getters that need it
+        with mock.patch.object(Network, '_buildProjection', wraps=net4._buildProjection) as build:
+            net4.getMeanCoEnrollments()
+            net4.getUniqueEdges()
+            net4.getNetworkDensity()
+            net4.getAverageClusterCoeff()
+            net4.getPersonToPersonEdges()
+            self.assertEqual(build.call_count, 1)
+
+        net4.getLargestProportion()
+        net4.largestComponentToNetwork()
+        net4.getCharPathLength()
+        net4.getBetweennessCentrality()
+        net4.getBinPersonToPersonNetworkX()
+
+        info = net4.getCacheInfo()
+        for name in ['incidence', 'projection', 'graph', 'components', 'largest', 'histogram', 'clustering', 'betweenness']:
+            self.assertIn(name, info)
+            self.assertGreater(info[name], 0)
+        self.assertIs(net4.largestComponentToNetwork(), net4.largestComponentToNetwork())
+
+        net4.invalidate()
+        self.assertEqual(net4.getCacheInfo(), {})
+        self.assertAlmostEqual(net4.getMeanCoEnrollments(), 28/7, delta=0.00001)
+
+    def testGetClusterCoeffs(self):
+        for network in [net1, net2, net3]:
+            expected = nx.clustering(network.getBinPersonToPersonNetworkX())
+            actual = network.getClusterCoeffs()
+            for i, person in enumerate(network.getPersons()):
+                self.assertAlmostEqual(actual[i], expected.get(person, 0), delta=0.00001)
+        
+        # a few rows at a time
+        projection = net3._getProjection()
+        self.assertEqual(clustering.triangleCounts(projection.indptr, projection.indices, blockPaths=5).tolist(),
+                         clustering.triangleCounts(projection.indptr, projection.indices).tolist())
+    
+    def testGetBetweennessCentralities(self):
+        for network in [net1, net2, net3]:
+            expected = nx.betweenness_centrality(network.getPersonToGroupNetworkX())
+            persons, groups = network.getBetweennessCentralities()
+            for i, person in enumerate(network.getPersons()):
+                self.assertAlmostEqual(persons[i], expected[person], delta=0.00001)
+            for i, group in enumerate(network.getGroups()):
+                self.assertAlmostEqual(groups[i], expected[group], delta=0.00001)
+        
+        # pivots, the same for the same seed
+        approx = net3.getApproxBetweennessCentrality(samples=12, seed=5)
+        self.assertEqual(approx, net3.getApproxBetweennessCentrality(samples=12, seed=5))
+        self.assertAlmostEqual(net3.getApproxBetweennessCentrality(samples=24), net3.getBetweennessCentrality(), delta=0.00001)
+        self.assertFalse(np.isnan(net3.getApproxBetweennessCentrality(samples=2, seed=1)))
+        self.assertRaises(Exception, net3.getApproxBetweennessCentrality, samples=1)
+        self.assertRaises(Exception, net3.getBetweennessCentralities, samples=0)
+        
+        # searches split between workers
+        parallel = Network('test3.csv', workers=2)
+        self.assertAlmostEqual(parallel.getBetweennessCentrality(), net3.getBetweennessCentrality(), delta=0.00001)
+    
+    def testGetCoEnrollments(self):
+        for network in [net1, net2, net3]:
+            counts = network.getPersonToPerson()
+            expected = [sum(row) - row[i] for i, row in enumerate(counts)]
+            self.assertEqual(network.getCoEnrollments().tolist(), expected)
+            expected = [sum(row) - row[i] for i, row in enumerate(network.getBinPersonToPerson())]
+            self.assertEqual(network.getUniqueCoEnrollments().tolist(), expected)
+        
+        summary = net1.getCoEnrollmentSummary(percentiles=[50])
+        self.assertEqual(sorted(summary['coEnrollments']), ['max', 'mean', 'min', 'p50'])
+        self.assertAlmostEqual(summary['coEnrollments']['mean'], net1.getMeanCoEnrollments(), delta=0.00001)
+        self.assertEqual(summary['uniqueCoEnrollments']['max'], 4)
+    
+    def testBatchAnalysis(self):
+        data = net2.getNetworkData()
+        self.assertFalse(data['wholeNetwork'])
+        self.assertEqual(data['componentPersons'], 5)
+        self.assertAlmostEqual(data['charPathLength'], net2.largestComponentToNetwork().getCharPathLength(), delta=0.00001)
+        
+        jobs = batchAnalysis.findJobs(['test*.csv', 'both=test1.csv,test3.csv'])
+        self.assertEqual(jobs[-1], ['both', ['test1.csv', 'test3.csv']])
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'results.jsonl')
+            self.assertEqual(batchAnalysis.runBatch(jobs[:2], name), 2)
+            
+            # only the inputs without rows are analyzed again
+            self.assertEqual(batchAnalysis.runBatch(jobs, name, workers=2), 2)
+            with open(name) as file:
+                rows = [json.loads(line) for line in file]
+            self.assertEqual(sorted(row['input'] for row in rows), ['both', 'test1.csv', 'test2.csv', 'test3.csv'])
+            self.assertEqual(rows[0]['uniqueEdges'], net1.getUniqueEdges())
+            self.assertIn('pathsSeconds', rows[0])
+        
+        # a row cut off when a run stopped is dropped and analyzed again
+        for form in ['jsonl', 'csv']:
+            with tempfile.TemporaryDirectory() as directory:
+                name = os.path.join(directory, 'results.' + form)
+                jobs = [['test1.csv', ['test1.csv']], ['test2.csv', ['test2.csv']]]
+                batchAnalysis.runBatch(jobs, name, form)
+                whole = batchAnalysis.finishedRows(name, form)['test2.csv']
+                with open(name, 'rb+') as file:
+                    file.truncate(os.path.getsize(name) - 40)
+                self.assertEqual(sorted(batchAnalysis.finishedRows(name, form)), ['test1.csv'])
+                self.assertEqual(batchAnalysis.runBatch(jobs, name, form), 1)
+                rows = batchAnalysis.finishedRows(name, form)
+                self.assertEqual(sorted(rows), ['test1.csv', 'test2.csv'])
+                self.assertEqual(rows['test2.csv']['density'], whole['density'])
+                self.assertEqual(batchAnalysis.runBatch(jobs, name, form), 0)
+        
+        # the same links in a different order are analyzed once
+        with tempfile.TemporaryDirectory() as directory:
+            with open('test1.csv') as file:
+                lines = [line for line in file if line.strip()]
+            copy = os.path.join(directory, 'copy.csv')
+            with open(copy, 'w') as file:
+                file.write(''.join(reversed(lines)))
+            
+            same = os.path.join(directory, 'same.csv')
+            with open(same, 'w') as file:
+                file.write(''.join(lines))
+            
+            # the worker stops after loading a job whose links are known
+            known = {}
+            self.assertIn('clustering', batchAnalysis.analyze(['test1.csv', ['test1.csv']], known=known))
+            row = batchAnalysis.analyze(['copy', [copy]], known=known)
+            self.assertEqual(row['duplicateOf'], 'test1.csv')
+            self.assertNotIn('clustering', row)
+            
+            name = os.path.join(directory, 'results.csv')
+            jobs = [['test1.csv', ['test1.csv']], ['copy', [copy]], ['same', [same]], ['test3.csv', ['test3.csv']]]
+            self.assertEqual(batchAnalysis.runBatch(jobs, name, 'csv'), 4)
+            rows = batchAnalysis.finishedRows(name, 'csv')
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(rows['copy']['duplicateOf'], 'test1.csv')
+            self.assertEqual(rows['same']['duplicateOf'], 'test1.csv')
+            self.assertEqual(rows['copy']['clustering'], rows['test1.csv']['clustering'])
+            self.assertEqual(rows['same']['clustering'], rows['test1.csv']['clustering'])
+            self.assertEqual(rows['copy']['pathsSeconds'], '')
+            self.assertEqual(rows['test3.csv']['duplicateOf'], '')
+            
+            # and with rows from an earlier run
+            jobs.append(['again', [copy]])
+            self.assertEqual(batchAnalysis.runBatch(jobs, name, 'csv'), 1)
+            self.assertEqual(batchAnalysis.finishedRows(name, 'csv')['again']['duplicateOf'], 'test1.csv')
+    
+    def testBenchmark(self):
+        links = benchmark.generateLinks(200, seed=3)
+        self.assertEqual(links, benchmark.generateLinks(200, seed=3))
+        self.assertNotEqual(links, benchmark.generateLinks(200, seed=4))
+        self.assertEqual(len(set(links[0])), 200)
+        
+        methods = [method for method in benchmark.METHODS if method[0] in ['getMeanCoEnrollments', 'getCharPathLength']]
+        results = benchmark.runBenchmarks([50, 100], repeats=1, exactLimit=50, methods=methods)
+        self.assertEqual([result['method'] for result in results], ['Network', 'getMeanCoEnrollments', 'getCharPathLength'] * 2)
+        self.assertTrue(results[-1]['skipped'])
+        self.assertGreater(results[0]['peakBytes'], 0)
+        self.assertEqual([result['engine'] for result in results], ['projection'] * 3 + ['bipartite'] * 3)
+        self.assertEqual(set(result['engine'] for result in benchmark.runBenchmarks([50], 1, methods=[], engine='bipartite')), {'bipartite'})
+        
+        slower = [dict(result, seconds=result['seconds'] * 2 + 1) for result in results if 'seconds' in result]
+        self.assertEqual(len(benchmark.compareResults(slower, results)), len(slower))
+        self.assertEqual(benchmark.compareResults(results, slower), [])
+    
+    def testProfiler(self):
+        records = []
+        profiler = Profiler(callback=records.append, memory=True)
+        try:
+            network = Network('test2.csv', profiler=profiler)
+            network.getNetworkData()
+            network.getApproxCharPathLength(samples=4, seed=1)
+        finally:
+            profiler.stop()
+        
+        report = profiler.getReport()
+        for name in ['load', 'incidence', 'projection', 'components', 'largest', 'betweenness', 'histogram', 'sample']:
+            self.assertIn(name, report)
+        self.assertEqual(report['load']['counts']['links'], 14)
+        self.assertEqual(report['sample']['counts']['sources'], 4)
+        self.assertEqual(len(records), sum(total['calls'] for total in report.values()))
+        self.assertGreater(records[0]['peakBytes'], 0)
+        
+        # the path metrics are for the largest component
+        histogram = [record for record in records if record['stage'] == 'histogram']
+        self.assertEqual(histogram[0]['counts']['sources'], 5)
+    
+    def testSmallWorld(self):
+        rows, cols = net3._linkPersons, net3._linkGroups
+        newRows, newCols = nullModel.rewireLinks(rows, cols, 10, np.random.default_rng(1))
+        self.assertEqual(np.bincount(newRows).tolist(), np.bincount(rows).tolist())
+        self.assertEqual(np.bincount(newCols).tolist(), np.bincount(cols).tolist())
+        self.assertEqual(len(set(zip(newRows.tolist(), newCols.tolist()))), len(rows))
+        self.assertNotEqual(newCols.tolist(), cols.tolist())
+        
+        self.assertAlmostEqual(nullModel.latticeClustering(4), 0.5, delta=0.00001)
+        
+        data = net3.getSmallWorld(members=6, seed=2)
+        self.assertEqual(data, Network('test3.csv', workers=2).getSmallWorld(members=6, seed=2))
+        self.assertLessEqual(data['sigmaLow'], data['sigma'])
+        self.assertLessEqual(data['sigma'], data['sigmaHigh'])
+        self.assertAlmostEqual(data['clustering'], net3.getAverageClusterCoeff(), delta=0.00001)
+        expected = data['randomCharPathLength'] / data['charPathLength'] - data['clustering'] / data['latticeClustering']
+        self.assertAlmostEqual(data['omega'], expected, delta=0.00001)
+    
+    def testLayout(self):
+        positions = layout.layoutNetwork(net3, seed=1)
+        self.assertEqual(sorted(positions), net3.getPersons())
+        self.assertEqual(positions, layout.layoutNetwork(net3, seed=1))
+        
+        # linked persons end up closer than persons on average
+        points = np.array([positions[person] for person in net3.getPersons()])
+        names, adjacency = layout.networkAdjacency(net3)
+        links = adjacency.tocoo()
+        linked = np.linalg.norm(points[links.row] - points[links.col], axis=1).mean()
+        everyone = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2).sum() / (len(points) * (len(points) - 1))
+        self.assertLess(linked, everyone)
+        
+        # a warm start keeps persons near where they were
+        changed = Network('test3.csv')
+        changed.addLink('Q', 'G1')
+        before = layout.layoutNetwork(net3, 'personToGroup', seed=1)
+        after = layout.layoutNetwork(changed, 'personToGroup', seed=1, previous=before)
+        self.assertIn('Q', after)
+        distance = np.mean([np.linalg.norm(np.subtract(after[name], before[name])) for name in before])
+        self.assertLess(distance, 0.1)
+    
+    def testFingerprint(self):
+        reordered = Network([['B','G2'],['A','G1'],['A','G2']])
+        self.assertEqual(reordered.getFingerprint(), Network([['A','G2'],['A','G1'],['B','G2']]).getFingerprint())
+        self.assertNotEqual(reordered.getFingerprint(), Network([['A','G2'],['B','G1'],['B','G2']]).getFingerprint())
+        self.assertNotEqual(net1.getFingerprint(), net2.getFingerprint())
+        
+        # kept up to date with changes
+        changed = Network('test1.csv')
+        changed.addLink('Z', 'G9')
+        self.assertNotEqual(changed.getFingerprint(), net1.getFingerprint())
+        changed.removeLink('Z', 'G9')
+        self.assertEqual(changed.getFingerprint(), net1.getFingerprint())
+        self.assertEqual(changed, net1)
+        
+        self.assertEqual((fingerprint.linkHash('A', 'G1') + fingerprint.linkHash('A', 'G2')) & fingerprint.MASK,
+                         Network([['A','G1'],['A','G2']]).getFingerprint())
+    
+    def testUpdates(self):
+        with open('test3.csv') as file:
+            edges = [line.strip().split(',')[:2] for line in file if line.strip()]
+        
+        # drop the first few links, add new persons and groups, and compare
+        # with Networks built from the same links
+        changed = Network(edges)
+        changed.getLargestProportion()
+        kept = edges[6:]
+        for person, group in edges[:6]:
+            changed.removeLink(person, group)
+        changed.addLink('Q', 'G9')
+        changed.addPerson('R', ['G9', 'G1'])
+        changed.addGroup('G10', ['A', 'Q'])
+        kept = kept + [['Q','G9'], ['R','G9'], ['R','G1'], ['A','G10'], ['Q','G10']]
+        
+        # counts kept up to date first, then the rebuilt Network
+        fresh = Network(kept)
+        self.assertEqual(changed.getUniqueEdges(), fresh.getUniqueEdges())
+        self.assertAlmostEqual(changed.getNetworkDensity(), fresh.getNetworkDensity(), delta=0.00001)
+        self.assertAlmostEqual(changed.getMeanCoEnrollments(), fresh.getMeanCoEnrollments(), delta=0.00001)
+        self.assertAlmostEqual(changed.getMeanUniqueCoEnrollments(), fresh.getMeanUniqueCoEnrollments(), delta=0.00001)
+        self.assertEqual(changed.getLargestProportion(), fresh.getLargestProportion())
+        self.assertEqual(changed, fresh)
+        self.assertAlmostEqual(changed.getCharPathLength(), fresh.getCharPathLength(), delta=0.00001)
+        
+        changed.removePerson('R')
+        changed.removeGroup('G10')
+        fresh = Network(kept[:-4])
+        self.assertEqual(changed.getLargestProportion(), fresh.getLargestProportion())
+        self.assertEqual(changed.getUniqueEdges(), fresh.getUniqueEdges())
+        self.assertEqual(changed, fresh)
+        self.assertRaises(Exception, changed.removeLink, 'R', 'G9')
+        
+    def testUpdatesKeepCache(self):
+        with open('test3.csv') as file:
+            edges = [line.strip().split(',')[:2] for line in file if line.strip()]
+        
+        # the projection, components and clustering are carried over to the
+        # changed links, not built again
+        changed = Network(edges)
+        changed.getLargestProportion()
+        changed.getAverageClusterCoeff()
+        changed.addLink('Q', 'G9')
+        changed.addPerson('A', ['G9', 'G10'])
+        changed.addLink('B', 'G10')
+        fresh = Network(edges + [['Q','G9'], ['A','G9'], ['A','G10'], ['B','G10']])
+        projection = fresh._getProjection()
+        labels = fresh._getComponents()
+        with mock.patch.object(Network, '_buildProjection') as build, mock.patch.object(components, 'componentLabels') as found:
+            self.assertEqual((changed._getProjection() != projection).nnz, 0)
+            self.assertEqual(changed._getComponents().tolist(), labels.tolist())
+            self.assertEqual((changed._getIncidence() != fresh._getIncidence()).nnz, 0)
+        self.assertTrue(np.allclose(changed.getClusterCoeffs(), fresh.getClusterCoeffs()))
+        self.assertEqual(build.call_count, 0)
+        self.assertEqual(found.call_count, 0)
+        
+        # removed links and persons drop out of the projection
+        changed.removePerson('Q')
+        changed.removeLink(edges[0][0], edges[0][1])
+        fresh = Network(edges[1:] + [['A','G9'], ['A','G10'], ['B','G10']])
+        projection = fresh._getProjection()
+        with mock.patch.object(Network, '_buildProjection') as build:
+            self.assertEqual((changed._getProjection() != projection).nnz, 0)
+        self.assertEqual(build.call_count, 0)
+        self.assertTrue(np.allclose(changed.getClusterCoeffs(), fresh.getClusterCoeffs()))
+        self.assertAlmostEqual(changed.getAverageClusterCoeff(), fresh.getAverageClusterCoeff(), delta=0.00001)
+        self.assertEqual(changed, fresh)
+    
+    def testPersonQueries(self):
+        graph = net3.getBinPersonToPersonNetworkX()
+        coEnrollments = dict(zip(net3.getPersons(), net3.getCoEnrollments().tolist()))
+        bipartite = net3.getPersonToGroupNetworkX()
+        for person in net3.getPersons():
+            lengths = nx.single_source_shortest_path_length(graph, person)
+            for k in [0, 1, 2, 4]:
+                reach = net3.getPersonReach(person, k)
+                expected = sorted(other for other, d in lengths.items() if 0 < d <= k)
+                self.assertEqual(reach['persons'], expected)
+                self.assertEqual(reach['count'], len(expected))
+                self.assertEqual(reach['counts'], [sum(1 for d in lengths.values() if d == x) for x in range(1, k+1)])
+            
+            stats = net3.getPersonStats(person)
+            self.assertEqual(stats['degree'], graph.degree(person))
+            self.assertEqual(stats['coEnrollments'], coEnrollments[person])
+            self.assertEqual(stats['groups'], bipartite.degree(person))
+            self.assertAlmostEqual(stats['clustering'], nx.clustering(graph, person), delta=0.00001)
+        
+        # the groups of the steps, and paths through shared groups
+        persons = net3.getPersons()
+        self.assertEqual(net3.getPersonReach(persons[0], 1)['groups'], sorted(bipartite[persons[0]]))
+        for target in persons:
+            path = net3.getConnectingPath(persons[0], target)
+            if target in nx.node_connected_component(graph, persons[0]):
+                self.assertEqual(len(path) // 2, nx.shortest_path_length(graph, persons[0], target))
+                self.assertEqual(path[-1], target)
+                for i in range(1, len(path), 2):
+                    self.assertTrue(bipartite.has_edge(path[i-1], path[i]) and bipartite.has_edge(path[i], path[i+1]))
+            else:
+                self.assertEqual(path, [])
+        self.assertRaises(Exception, net3.getPersonReach, 'Nobody', 1)
+    
+    def testTemporalNetwork(self):
+        files = ['test1.csv', 'test2.csv', 'test3.csv']
+        terms = TemporalNetwork(files, names=['fall', 'spring', 'summer'])
+        self.assertEqual(terms.getPersons(), Network(files).getPersons())
+        self.assertEqual(terms.getTerm('spring'), net2)
+        self.assertEqual(terms.getCumulative(2), Network(files))
+        named = TemporalNetwork([['test1.csv'], 'test2.csv', ['test1.csv', 'test3.csv'], [['A', 'G1']]])
+        self.assertEqual(named.getTermNames(), ['test1.csv', 'test2.csv', 'term3', 'term4'])
+        
+        # metrics of each term (and of the cumulative Networks) match those of
+        # Networks built on their own
+        for cumulative in [False, True]:
+            metrics = terms.getTermMetrics(cumulative)
+            for t, metric in enumerate(metrics):
+                network = Network(files[:t+1] if cumulative else files[t])
+                self.assertEqual(metric['uniqueEdges'], network.getUniqueEdges())
+                self.assertAlmostEqual(metric['density'], network.getNetworkDensity(), delta=0.00001)
+                self.assertAlmostEqual(metric['meanUniqueCoEnrollments'], network.getMeanUniqueCoEnrollments(), delta=0.00001)
+                self.assertAlmostEqual(metric['clustering'], network.getAverageClusterCoeff(), delta=0.00001)
+                self.assertEqual([metric['proportionPersons'], metric['proportionGroups']], network.getLargestProportion())
+                self.assertEqual(metric['reach2'], network.getKStepReach(2))
+        
+        # changes from term to term, the same with the terms split between
+        # workers
+        changes = TemporalNetwork(files, workers=2).getTermChanges()
+        edges = [set(map(frozenset, nx.Graph(Network(name).getBinPersonToPersonNetworkX()).edges())) for name in files]
+        self.assertEqual([change['edgesAdded'] for change in changes], [len(edges[1] - edges[0]), len(edges[2] - edges[1])])
+        self.assertEqual([change['edgesRemoved'] for change in changes], [len(edges[0] - edges[1]), len(edges[1] - edges[2])])
+        self.assertEqual(changes[0]['componentsChange'], 1)
+        self.assertEqual(changes[1]['uniqueEdgesChange'], net3.getUniqueEdges() - net2.getUniqueEdges())
+    
+    def testOutOfCore(self):
+        # a tiny memory budget, so the sorts write and merge many runs
+        for engine in ['projection', 'bipartite']:
+            with tempfile.TemporaryDirectory() as directory:
+                network = OutOfCoreNetwork('test3.csv', directory=directory, memoryBudget=256, engine=engine)
+                self.assertEqual(network.getPersons(), net3.getPersons())
+                self.assertEqual(network.getUniqueEdges(), net3.getUniqueEdges())
+                self.assertAlmostEqual(network.getNetworkDensity(), net3.getNetworkDensity(), delta=0.00001)
+                self.assertAlmostEqual(network.getMeanCoEnrollments(), net3.getMeanCoEnrollments(), delta=0.00001)
+                self.assertAlmostEqual(network.getMeanUniqueCoEnrollments(), net3.getMeanUniqueCoEnrollments(), delta=0.00001)
+                self.assertEqual(network.getKStepReach(4, True), net3.getKStepReach(4, True))
+                self.assertAlmostEqual(network.getCharPathLength(), net3.getCharPathLength(), delta=0.00001)
+                self.assertEqual(network.getNetworkDiameter(), net3.getNetworkDiameter())
+                self.assertEqual(network.getApproxNetworkDiameter(seed=1), net3.getApproxNetworkDiameter(seed=1))
+                self.assertEqual(network.getApproxCharPathLength(tolerance=0.05, seed=1), net3.getApproxCharPathLength(tolerance=0.05, seed=1))
+                self.assertEqual(network.getApproxKStepReach(2, True, tolerance=0.05, seed=1), net3.getApproxKStepReach(2, True, tolerance=0.05, seed=1))
+                self.assertEqual(network.getLoadStats()['links'], net3.getLoadStats()['links'])
+                self.assertEqual(sorted(network.getDiskInfo()), ['adjacency.bin', 'incidence.bin', 'members.bin'])
+        
+        # workers open the arrays on disk where they are, only the arrays in
+        # memory (the row pointers) are written for them, in the directory
+        with tempfile.TemporaryDirectory() as directory:
+            network = OutOfCoreNetwork('test3.csv', directory=directory, memoryBudget=256, workers=2)
+            with mock.patch.object(np, 'save', wraps=np.save) as save:
+                self.assertEqual(network.getKStepReach(4, True), net3.getKStepReach(4, True))
+            self.assertEqual(save.call_count, 1)
+            self.assertEqual(os.path.dirname(os.path.dirname(save.call_args[0][0])), directory)
+        
+        # links read a chunk at a time, with repeats, as for Network
+        edges = [['B','G2'], ['A','G1'], ['B','G2'], ['C','G1'], ['A','G2']]
+        with mock.patch.object(loader, 'loadLinks') as load:
+            network = OutOfCoreNetwork(edges, memoryBudget=256)
+        self.assertEqual(load.call_count, 0)
+        expected = Network(edges)
+        self.assertEqual(network.getPersons(), expected.getPersons())
+        self.assertEqual(network.getGroups(), expected.getGroups())
+        self.assertEqual(network.getUniqueEdges(), expected.getUniqueEdges())
+        self.assertEqual(network.getMeanCoEnrollments(), expected.getMeanCoEnrollments())
+        self.assertEqual(network.getLoadStats()['links'], 4)
+        network.close()
+        
+        network = OutOfCoreNetwork('test2.csv', memoryBudget=256)
+        self.assertEqual(network.getLargestProportion(), net2.getLargestProportion())
+        self.assertEqual(network.getCharPathLength(), -1.0)
+        directory = network._directory
+        network.close()
+        self.assertFalse(os.path.exists(directory))
+        
+        # merging runs keeps repeats once when unique
+        with tempfile.TemporaryDirectory() as directory:
+            keys = np.random.default_rng(0).integers(0, 50, 500)
+            runs = outOfCore.writeRuns([keys[i:i + 30] for i in range(0, 500, 30)], directory, 'keys', 400, True)
+            name = os.path.join(directory, 'keys.bin')
+            self.assertEqual(outOfCore.mergeRuns(runs, name, 400, True), len(np.unique(keys)))
+            self.assertEqual(np.fromfile(name, dtype=np.int64).tolist(), np.unique(keys).tolist())
+    
+    def testSnapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'net3.snap')
+            net4 = Network('test3.csv', engine='bipartite')
+            expected = net4._getData(4)
+            net4.getLargestProportion()
+            net4.save(name)
+
+            for memoryMap in [True, False]:
+                actual = Network.load(name, sources='test3.csv', memoryMap=memoryMap)
+                self.assertEqual(actual, net4)
+                self.assertEqual(actual._personIds, net4._personIds)
+                self.assertEqual(actual.getFingerprint(), net3.getFingerprint())
+                self.assertEqual(actual.getUniqueEdges(), net3.getUniqueEdges())
+
+                # the histogram and components are not found again
+                with mock.patch('paths.distances') as search, mock.patch('components.componentLabels') as labels:
+                    self.assertEqual(actual._getData(4), expected)
+                    self.assertEqual(actual.getLargestProportion(), [1.0, 1.0])
+                    self.assertEqual(search.call_count, 0)
+                    self.assertEqual(labels.call_count, 0)
+
+            # projection saved with the Network
+            net1.save(name)
+            self.assertEqual(Network.load(name).getPersonToPersonEdges(), net1.getPersonToPersonEdges())
+
+            # saving a memory-mapped Network over its own snapshot
+            reopened = Network.load(name)
+            reopened.save(name)
+            self.assertEqual(Network.load(name), net1)
+            self.assertEqual(Network.load(name).getUniqueEdges(), net1.getUniqueEdges())
+            
+            # stale snapshot
+            self.assertRaises(Exception, Network.load, name, sources='test2.csv')
+
+    def testGetPersonToGroupNetworkX(self):
+        expected4 = [('A','G1'), ('G1','B'), ('B','G2')]
+        net4 = Network([['A','G1'],['B','G1'],['B','G2'],['A','G1']])
+
+        self.assertEqual(list(net4.getPersonToGroupNetworkX().edges()), expected4)
+        self.assertEqual(net1.getPersonToGroupNetworkX().number_of_edges(), 12)
+        self.assertEqual(net4._personIds, {'A': 0, 'B': 1})
+        self.assertEqual(net4._groupIds, {'G1': 0, 'G2': 1})
+
     def testLargestComponentToNetwork(self):
         expected1 = net1
         expected2 = net1
@@ -52,8 +591,34 @@ class NetworkTester(unittest.TestCase):
         self.assertEqual(net1.largestComponentToNetwork(), expected1)
         self.assertEqual(net2.largestComponentToNetwork(), expected2)
         self.assertEqual(net3.largestComponentToNetwork(), expected3) 
-        self.assertEqual(net4.largestComponentToNetwork(), expected4)  
-    
+        self.assertEqual(net4.largestComponentToNetwork(), expected4)
+
+    def testComponentsFoundOnce(self):
+        net4 = Network([['A','G1'],['B','G2'],['C','G3'],['D','G3'],['E','G4']], engine='bipartite')
+
+        with mock.patch('components.componentLabels', wraps=components.componentLabels) as labels:
+            net4.getLargestProportion()
+            net4._getPersonsGroupsLargestComp()
+            comp = net4.largestComponentToNetwork()
+            self.assertEqual(labels.call_count, 1)
+
+        self.assertEqual(net4._getPersonsGroupsLargestComp(), {'C', 'D', 'G3'})
+        self.assertEqual(comp.getPersons(), ['C', 'D'])
+        self.assertNotIn('graph', comp.getCacheInfo())
+
+    def testEquality(self):
+        # same persons and groups, different links
+        net4 = Network([['A','G1'],['B','G2'],['A','G2']])
+        net5 = Network([['A','G1'],['B','G2'],['B','G1']])
+
+        # repeated links
+        net6 = Network([['A','G1'],['B','G2'],['A','G2'],['A','G1']])
+
+        self.assertEqual(net1, Network('test1.csv'))
+        self.assertNotEqual(net1, net2)
+        self.assertNotEqual(net4, net5)
+        self.assertEqual(net4, net6)
+
     def testGetLargestProportion(self):
         expected1 = [5/5, 4/4]
         expected2 = [5/7, 4/5]
@@ -98,7 +663,15 @@ class NetworkTester(unittest.TestCase):
         self.assertEqual(net1.getBinPersonToPerson(), expected1)
         self.assertEqual(net2.getBinPersonToPerson(), expected2)
         self.assertEqual(net3.getBinPersonToPerson(), expected3)
-    
+
+    def testGetPersonToPersonEdges(self):
+        expected1 = [['A','B',1], ['A','C',2], ['A','D',2], ['A','E',3], ['B','C',1], ['C','D',1], ['C','E',1], ['D','E',2]]
+        expected2 = expected1 + [['F','G',1]]
+
+        self.assertEqual(net1.getPersonToPersonEdges(), expected1)
+        self.assertEqual(net2.getPersonToPersonEdges(), expected2)
+        self.assertEqual(len(net3.getPersonToPersonEdges()), net3.getUniqueEdges())
+
     def testGetMeanCoEnrollments(self):
         expected1 = 26/5
         expected2 = 28/7
@@ -172,6 +745,24 @@ class NetworkTester(unittest.TestCase):
         self.assertEqual(net3.getNetworkDiameter(), expected3)
         self.assertEqual(net4.getNetworkDiameter(), expected4)
     
+    def testGetBoundedDiameter(self):
+        # path (larger distance)
+        edges4 = [['A','G1'],['B','G1'],['B','G2'],['C','G2'],['C','G3'],['D','G3'],['D','G4'],['E','G4'],['E','G5'],['F','G5']]
+
+        for edges, expected in [('test1.csv', 2), ('test2.csv', -1), ('test3.csv', 2), (edges4, 5)]:
+            for engine in ['projection', 'bipartite']:
+                net = Network(edges, engine=engine)
+                actual = net.getBoundedDiameter()
+
+                self.assertEqual(actual['diameter'], expected)
+                self.assertLessEqual(actual['searches'], len(net.getPersons()))
+
+        # a few searches for a long path of persons
+        edges5 = [['P%d' % (i), 'G%d' % (i)] for i in range(40)] + [['P%d' % (i+1), 'G%d' % (i)] for i in range(39)]
+        actual = Network(edges5).getBoundedDiameter()
+        self.assertEqual(actual['diameter'], 39)
+        self.assertLessEqual(actual['searches'], 3)
+
     def testGetKStepReach(self):
         expected1 = [0/10, 8/10, 10/10, 10/10, 10/10]
         expected2 = [0/21, 9/21, 11/21, 11/21, 11/21]
@@ -189,7 +780,78 @@ class NetworkTester(unittest.TestCase):
         actual4 = net4.getKStepReach(5, multiple=True)
         for k in range(len(expected4)):
             self.assertAlmostEqual(actual4[k], expected4[k], delta=0.00001, msg=("when k = %d" % (k)))
-        
+
+    def testSinglePathTraversal(self):
+        net4 = Network('test3.csv')
+
+        # one breadth-first search from each person, for all the path metrics
+        with mock.patch('paths.distances', wraps=paths.distances) as search:
+            net4.getCharPathLength()
+            net4.getNetworkDiameter()
+            for k in range(11):
+                net4.getKStepReach(k)
+                net4.getKStepReach(k, multiple=True)
+            self.assertEqual(search.call_count, len(net4.getPersons()))
+
+    def testParallelPaths(self):
+        for edges in ['test1.csv', 'test2.csv', 'test3.csv']:
+            for engine in ['projection', 'bipartite']:
+                expected = Network(edges, engine=engine)._getData(5)
+                actual = Network(edges, engine=engine, workers=2)._getData(5)
+
+                self.assertEqual(actual, expected, msg=("for %s, %s" % (edges, engine)))
+
+    def testApproxPathMetrics(self):
+        # path (larger distance)
+        net4 = Network([['A','G1'],['B','G1'],['B','G2'],['C','G2'],['C','G3'],['D','G3'],['D','G4'],['E','G4'],['E','G5'],['F','G5']])
+
+        # sampling every person gives the exact values
+        for net in [net1, net3, net4]:
+            expected = net._getData(4)
+            path = net.getApproxCharPathLength(samples=len(net.getPersons()), seed=1)
+            reach = net.getApproxKStepReach(4, multiple=True, samples=len(net.getPersons()), seed=1)
+
+            self.assertAlmostEqual(path['path'], expected['path'], delta=0.00001)
+            self.assertAlmostEqual(path['low'], path['high'], delta=0.00001)
+            for k in range(5):
+                self.assertAlmostEqual(reach['reach'][k], expected['reach'][k], delta=0.00001, msg=("when k = %d" % (k)))
+
+        # a sample gives an interval around the estimate, repeatable by seed
+        path = net3.getApproxCharPathLength(samples=6, seed=7)
+        self.assertEqual(path, net3.getApproxCharPathLength(samples=6, seed=7))
+        self.assertEqual(path['samples'], 6)
+        self.assertLessEqual(path['low'], path['path'])
+        self.assertLessEqual(path['path'], path['high'])
+
+        reach = net3.getApproxKStepReach(1, tolerance=0.5, seed=7)
+        self.assertLessEqual((reach['high'] - reach['low']) / 2, 0.5)
+
+        self.assertEqual(net2.getApproxCharPathLength(seed=1)['path'], -1.0)
+
+        # diameter bounds
+        for net in [net1, net3, net4]:
+            bounds = net.getApproxNetworkDiameter(seed=3)
+            self.assertLessEqual(bounds['lower'], net.getNetworkDiameter())
+            self.assertGreaterEqual(bounds['upper'], net.getNetworkDiameter())
+        self.assertEqual(net4.getApproxNetworkDiameter(seed=3)['lower'], 5)
+        self.assertEqual(net2.getApproxNetworkDiameter(seed=3)['lower'], -1)
+
+    def testBipartiteEngine(self):
+        # path (larger distance)
+        edges4 = [['A','G1'],['B','G1'],['B','G2'],['C','G2'],['C','G3'],['D','G3'],['D','G4'],['E','G4'],['E','G5'],['F','G5']]
+
+        for edges in ['test1.csv', 'test2.csv', 'test3.csv', edges4]:
+            expected = Network(edges)._getData(5)
+            actual = Network(edges, engine='bipartite')._getData(5)
+
+            self.assertEqual(actual['diameter'], expected['diameter'])
+            self.assertAlmostEqual(actual['path'], expected['path'], delta=0.00001)
+            for k in range(len(expected['reach'])):
+                self.assertAlmostEqual(actual['reach'][k], expected['reach'][k], delta=0.00001, msg=("when k = %d" % (k)))
+
+        self.assertNotIn('graph', Network('test3.csv', engine='bipartite').getCacheInfo())
+        self.assertRaises(Exception, Network, 'test1.csv', engine='dense')
+
         
 if __name__ == '__main__':
     print("\n--- Network 1 ---")